@@ -2,18 +2,98 @@ import os
 import pickle
 import numpy as np
 import pandas as pd
+from functools import lru_cache
 from mesa import Agent
 
+from alignment import align_by_hour_of_week
+from model_select import CyclicAxis, ValueAxis, OneHotAxis, lookup_within
 
 from .train_models import train_enterprise_models
 
+
+@lru_cache(maxsize=None)
+def load_regressor(path: str):
+    # Регрессор один на процесс: агенты только вызывают predict
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+@lru_cache(maxsize=None)
+def load_plan(path: str) -> pd.DataFrame:
+    # План общий для всех агентов и используется только на чтение
+    return pd.read_csv(path, parse_dates=['datetime']).set_index('datetime')
+
+@lru_cache(maxsize=None)
+def feature_columns(plan_path: str) -> tuple:
+    # Генерируем список признаков динамически (без внешних файлов)
+    # числовые признаки
+    base_feats = [
+        'Motor_and_Transformer_Load_kVarh',
+        'is_weekend',
+        'hour_sin',
+        'hour_cos',
+    ]
+    # категории Load_Type из плана
+    cats = sorted(load_plan(plan_path)['Load_Type'].dropna().unique())
+    # создаём dummy-признаки, пропуская первую категорию
+    dummy_feats = [f"Load_Type_{cat}" for cat in cats[1:]]
+    return tuple(base_feats + dummy_feats)
+
+
+def plan_features(plan: pd.DataFrame, is_weekend, columns) -> pd.DataFrame:
+    """
+    Признаки регрессора для строк плана plan:
+      - Motor_and_Transformer_Load_kVarh из плана
+      - is_weekend (будни/выходные)
+      - циклические признаки часа (sin/cos)
+      - dummy-признаки Load_Type (нулевые, см. ниже)
+    """
+    hour = plan.index.hour.to_numpy()
+    df = pd.DataFrame({
+        'Motor_and_Transformer_Load_kVarh': plan['Motor_and_Transformer_Load_kVarh'].to_numpy(),
+        'is_weekend':                       np.broadcast_to(np.asarray(is_weekend).astype(int), hour.shape),
+        'hour_sin':                         np.sin(2 * np.pi * hour / 24),
+        'hour_cos':                         np.cos(2 * np.pi * hour / 24),
+    })
+
+    # One-hot Load_Type и выравнивание по columns.
+    # Раньше кодирование шло через get_dummies(drop_first=True) по одной строке,
+    # что всегда отбрасывает единственную категорию: dummy-признаки нулевые.
+    # Сохраняем это поведение, чтобы не менять результаты.
+    for col in columns:
+        if col not in df.columns:
+            df[col] = 0.0
+    return df[list(columns)]
+
+
+@lru_cache(maxsize=None)
+def load_lookup(model_path: str, plan_path: str, tolerance: float):
+    """
+    Табличная замена регрессора (model_select.LookupRegressor): сетка по
+    часу × is_weekend × Load_Type × kVarh. Ошибка не больше tolerance кВт·ч
+    измеряется на всех строках плана в будни и выходные — на всех
+    признаках, которые может запросить агент.
+    """
+    regressor = load_regressor(model_path)
+    columns = feature_columns(plan_path)
+    plan = load_plan(plan_path)
+    X = pd.concat([plan_features(plan, w, columns) for w in (0, 1)], ignore_index=True)
+    axes = [CyclicAxis('hour_sin', 'hour_cos', 24), ValueAxis('is_weekend', [0, 1]),
+            OneHotAxis(columns[4:])]
+    return lookup_within(regressor, axes, 'Motor_and_Transformer_Load_kVarh', X, tolerance)
+
+
 class EnterpriseBuildingAgent(Agent):
     """
     Агент предприятия, предсказывающий почасовое энергопотребление,
     используя заранее сгенерированный план и обученную регрессию.
+
+    lookup_tolerance — вместо регрессора предсказывать по заранее
+    посчитанной таблице (load_lookup) с ошибкой не больше lookup_tolerance
+    кВт·ч за час; 0 — точная таблица по порогам деревьев. None — регрессор.
     """
-    def __init__(self, model):
-        
+    def __init__(self, model, lookup_tolerance: float | None = None):
+
         super().__init__(model)
         base_dir   = os.path.dirname(__file__)
         tm_dir     = os.path.join(base_dir, 'trained_models')
@@ -25,83 +105,53 @@ class EnterpriseBuildingAgent(Agent):
         if not os.path.isfile(model_path):
             train_enterprise_models()
 
-        # Загружаем регрессор
-        with open(model_path, 'rb') as f:
-            self.regressor = pickle.load(f)
-
+        # Загружаем регрессор (или его табличную замену)
+        self.lookup_tolerance = lookup_tolerance
+        if lookup_tolerance is None:
+            self.regressor = load_regressor(model_path)
+        else:
+            self.regressor = load_lookup(model_path, plan_path, float(lookup_tolerance))
 
         # Загружаем плановый годовой датасет
-        self.plan_df = (
-            pd.read_csv(plan_path, parse_dates=['datetime']).set_index('datetime')
-        )
-
-        # Генерируем список признаков динамически (без внешних файлов)
-        # числовые признаки
-        base_feats = [
-            'Motor_and_Transformer_Load_kVarh',
-            'is_weekend',
-            'hour_sin',
-            'hour_cos',
-        ]
-        # категории Load_Type из плана
-        cats = sorted(self.plan_df['Load_Type'].dropna().unique())
-        # создаём dummy-признаки, пропуская первую категорию
-        dummy_feats = [f"Load_Type_{cat}" for cat in cats[1:]]
-        self.feature_columns = base_feats + dummy_feats
+        self.plan_df = load_plan(plan_path)
+
+        # Список признаков общий для всех агентов с этим планом
+        self.feature_columns = list(feature_columns(plan_path))
 
         self.consumption = 0.0
+        # Предсказания на текущий блок окружения модели (model.env_block)
+        self._usage_block = None
+        self._block_usage = None
 
     def predict_usage(self) -> float:
         """
-        Собирает все признаки для текущего часа и возвращает предсказание в kWh.
-        Включает:
-          - Motor_and_Transformer_Load_kVarh и Load_Type из плана
-          - is_weekend (будни/выходные)
-          - циклические признаки часа (sin/cos)
-          - погодный признак T_out из модели
+        Предсказание в kWh за текущий шаг модели: сумма почасовых
+        предсказаний по часам шага, умноженных на их вес в часах.
+        Регрессор вызывается один раз на весь блок окружения модели.
+        """
+        block, i = self.model.env_block, self.model.env_block_pos
+        if self._usage_block is not block:
+            # Признак выходного дня — у всех часов шага как у самого шага
+            stamps = block['hour_stamps']
+            is_weekend = np.repeat(block['is_weekend'].astype(int), stamps.shape[1])
+            usage = self.predict_hours(stamps.ravel(), is_weekend)
+            self._block_usage = usage.reshape(stamps.shape)
+            self._usage_block = block
+        return float(self._block_usage[i].sum() * self.model.step_hour_weight)
+
+    def predict_hours(self, stamps, is_weekend) -> np.ndarray:
+        """
+        Собирает признаки (plan_features) для часовых меток stamps и
+        возвращает предсказания в kWh.
         """
-        dt = self.model.current_datetime
-
-        # 1) Признак выходного дня
-        is_weekend = int(self.model.current_WeekStatus != 'Weekday')
-
-        # 2) Циклические признаки времени
-        hour     = dt.hour
-        hour_sin = np.sin(2 * np.pi * hour / 24)
-        hour_cos = np.cos(2 * np.pi * hour / 24)
-
-        # 4) Специальные параметры из годового плана
-        plan_row = self.plan_df.loc[dt]
-        mtl      = plan_row['Motor_and_Transformer_Load_kVarh']
-        lt       = plan_row['Load_Type']
-
-        # 5) Собираем все «сырые» признаки
-        raw = {
-            'Motor_and_Transformer_Load_kVarh': mtl,
-            'is_weekend':                     is_weekend,
-            'hour_sin':                       hour_sin,
-            'hour_cos':                       hour_cos,
-            'Load_Type':                      lt
-        }
-
-        # 6) One-hot кодирование Load_Type и выравнивание по feature_columns
-        df = pd.get_dummies(
-            pd.DataFrame([raw]),
-            columns=['Load_Type'],
-            prefix='Load_Type',
-            drop_first=True
-        )
-        for col in self.feature_columns:
-            if col not in df.columns:
-                df[col] = 0.0
-        df = df[self.feature_columns]
-
-        # 7) Предсказание (kWh)
-        return float(self.regressor.predict(df)[0])
+        # Специальные параметры из годового плана; метки за пределами плана
+        # берутся из того же дня года, сдвинутого на тот же день недели
+        plan = self.plan_df.iloc[align_by_hour_of_week(self.plan_df.index, stamps)]
+        return self.regressor.predict(plan_features(plan, is_weekend, self.feature_columns))
 
     def step(self):
         """
-        Шаг агента: предсказывает энергопотребление в kWh,
+        Шаг агента: предсказывает энергопотребление в kWh за шаг,
         сохраняет в Wh и выводит лог.
         """
         usage_kwh = self.predict_usage()
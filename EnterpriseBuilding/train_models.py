@@ -6,6 +6,14 @@ train_models.py
 обучения нескольких моделей регрессии,
 сравнения их через графики,
 выбора лучшей по RMSE и сохранения её на диск по папкам.
+
+Для каждой модели и облегчённых вариантов лучшего ансамбля (усечённый,
+дистиллированный) записываются задержка predict и размер pickle
+(model_select.py); с бюджетом RMSE выбирается самый быстрый кандидат.
+
+Признаки кэшируются (feature_store.py); когда в Steel_industry_data.csv
+дописаны новые показания, update_enterprise_model дообучает сохранённую
+модель вместо полного переобучения.
 """
 import os
 import pickle
@@ -16,9 +24,16 @@ from sklearn.metrics import mean_squared_error, r2_score
 from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 
+import feature_store
+import model_select
+
+TARGET = 'Usage_kWh'
+# Меняется при изменении engineer_features (кэш прежней версии не используется)
+FEATURES_VERSION = 1
+
 
-def load_preprocess(path: str) -> pd.DataFrame:
-    df = pd.read_csv(path)
+def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Сырые 15-минутные строки → почасовые признаки и целевая колонка."""
     # Парсинг даты
     df['datetime'] = pd.to_datetime(df['datetime'], dayfirst=True)
     df.set_index('datetime', inplace=True)
@@ -30,7 +45,7 @@ def load_preprocess(path: str) -> pd.DataFrame:
         'WeekStatus': 'first',
         'Load_Type': 'first'
     }
-    df_h = df.resample('H').agg(agg).dropna()
+    df_h = df.resample('h').agg(agg).dropna()
 
     # Признаки
     df_h['is_weekend'] = (df_h['WeekStatus'] != 'Weekday').astype(int)
@@ -51,21 +66,26 @@ def load_preprocess(path: str) -> pd.DataFrame:
     # One-hot кодирование Load_Type
     load_type_dummies = pd.get_dummies(df_h['Load_Type'], prefix='Load_Type', drop_first=True)
 
-    # Финальный X с добавлением dummy-признаков
-    X = pd.concat([X_base, load_type_dummies], axis=1)
+    # Финальный X с добавлением dummy-признаков и целевая переменная
+    return pd.concat([X_base, load_type_dummies, df_h[TARGET]], axis=1)
 
-    # Целевая переменная
-    y = df_h['Usage_kWh']
 
-    return X, y
+def load_preprocess(path: str):
+    """Признаки X и цель y из кэша признаков (строятся при изменении файла)."""
+    df_h = feature_store.load_features('enterprise', path, engineer_features,
+                                       version=FEATURES_VERSION)
+    y = df_h.pop(TARGET)
+    return df_h, y
 
 
-def evaluate(name, model, X_tr, X_te, y_tr, y_te):
-    model.fit(X_tr, y_tr)
+def evaluate(name, model, X_tr, X_te, y_tr, y_te, fit: bool = True):
+    if fit:
+        model.fit(X_tr, y_tr)
     pred = model.predict(X_te)
     rmse = mean_squared_error(y_te, pred, squared=False)
     r2 = r2_score(y_te, pred)
-    return {'name': name, 'model': model, 'rmse': rmse, 'r2': r2, 'pred': pred}
+    return {'name': name, 'model': model, 'rmse': rmse, 'r2': r2, 'pred': pred,
+            **model_select.measure(model, X_te)}
 
 
 def plot_rmse(results, save_path: str):
@@ -94,7 +114,14 @@ def plot_scatter(best, X_te, y_te, save_path: str):
     plt.show()
 
 
-def train_enterprise_models():
+def train_enterprise_models(rmse_budget: float | None = None,
+                            rmse_tolerance: float | None = None,
+                            objective: str = 'latency_row_ms'):
+    """
+    Обучает и сравнивает модели; без бюджета сохраняет модель с наименьшим
+    RMSE, с бюджетом (rmse_budget или лучший RMSE × (1 + rmse_tolerance)) —
+    кандидата с наименьшим objective (model_select.select_model).
+    """
     base = os.path.dirname(__file__)
     # Пути
     data_path = os.path.join(base, 'data', 'Steel_industry_data.csv')
@@ -124,14 +151,26 @@ def train_enterprise_models():
     results = []
     for name, mdl in models.items():
         res = evaluate(name, mdl, X_tr, X_te, y_tr, y_te)
-        print(f"{res['name']:20} RMSE={res['rmse']:.3f}  R2={res['r2']:.3f}")
+        print(model_select.format_result(res))
+        results.append(res)
+
+    # Облегчённые варианты лучшей по RMSE модели
+    top = min(results, key=lambda x: x['rmse'])
+    for name, mdl in model_select.variants(top['model'], X_tr).items():
+        res = evaluate(f"{top['name']}/{name}", mdl, X_tr, X_te, y_tr, y_te, fit=False)
+        res['variant'] = True
+        print(model_select.format_result(res))
         results.append(res)
 
     # Лучшая модель
-    best = min(results, key=lambda x: x['rmse'])
+    best = model_select.select_model(results, rmse_budget, rmse_tolerance, objective)
     print(f"\nBest model: {best['name']} (RMSE={best['rmse']:.3f})")
 
-    # Сохраняем
+    # Сохраняем; trained_rows_ — сколько строк данных было при обучении
+    best['model'].trained_rows_ = len(X)
+    # Критерии выбора — чтобы полное переобучение при обновлении выбирало так же
+    best['model'].selection_ = {'rmse_budget': rmse_budget, 'rmse_tolerance': rmse_tolerance,
+                                'objective': objective}
     with open(model_path, 'wb') as f:
         pickle.dump(best['model'], f)
     print(f"Model saved to {model_path}")
@@ -139,10 +178,42 @@ def train_enterprise_models():
     metrics_path = os.path.join(trained_dir, 'model_metrics.txt')
     with open(metrics_path, 'w') as mf:
         for r in results:
-            mf.write(f"{r['name']}: RMSE={r['rmse']:.3f}, R2={r['r2']:.3f}\n")
+            mf.write(f"{r['name']}: RMSE={r['rmse']:.3f}, R2={r['r2']:.3f}, "
+                     f"latency_row={r['latency_row_ms']:.3f} ms, "
+                     f"latency_batch={r['latency_batch_ms']:.2f} ms, size={r['size_kb']:.1f} KB\n")
 
     # Визуализация
     rmse_plot = os.path.join(plots_dir, 'model_rmse_comparison.png')
     scatter_plot = os.path.join(plots_dir, 'best_model_scatter.png')
     plot_rmse(results, rmse_plot)
     plot_scatter(best, X_te, y_te, scatter_plot)
+
+
+def update_enterprise_model(n_estimators: int = 20):
+    """
+    Дообучает сохранённую модель на строках, дописанных в датасет после
+    обучения (feature_store.extend_model); без сохранённой модели или без
+    отметки trained_rows_ — полное обучение train_enterprise_models с
+    критериями выбора, сохранёнными в модели (selection_: бюджет RMSE и
+    objective).
+    """
+    base = os.path.dirname(__file__)
+    data_path = os.path.join(base, 'data', 'Steel_industry_data.csv')
+    model_path = os.path.join(base, 'trained_models', 'best_enterprise_model.pkl')
+    if not os.path.isfile(model_path):
+        return train_enterprise_models()
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    if not hasattr(model, 'trained_rows_'):
+        return train_enterprise_models(**getattr(model, 'selection_', {}))
+
+    X, y = load_preprocess(data_path)
+    n_new = len(X) - model.trained_rows_
+    if n_new <= 0:
+        print("Новых данных нет, модель не изменена")
+        return
+    model = feature_store.extend_model(model, X, y, n_new, n_estimators)
+    rmse = mean_squared_error(y.iloc[-n_new:], model.predict(X.iloc[-n_new:]), squared=False)
+    print(f"{type(model).__name__}: +{n_new} rows, RMSE on new rows={rmse:.3f}")
+    with open(model_path, 'wb') as f:
+        pickle.dump(model, f)
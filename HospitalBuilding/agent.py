@@ -5,7 +5,7 @@ class HospitalBuildingAgent(Agent):
     """
     Простой агент «Больница»:
     – Два расхода: тепло (равномерно в отопительный сезон) и электроэнергия (динамика по загруженности и операциям).
-    – Итог в self.consumption (Вт·ч) за час.
+    – Итог в self.consumption (Вт·ч) за шаг модели.
     """
 
     # Параметры здания
@@ -19,19 +19,24 @@ class HospitalBuildingAgent(Agent):
     HEAT_HOURS = 183 * 24
     _HEAT_HOURLY_NORM = EUI_HEAT_BASE * AREA_M2 / HEAT_HOURS  # кВт·ч/ч
 
+    # Потребление меняется только вместе с этими входами (для skip_idle модели)
+    STEADY_INPUTS = ('hospitalized', 'patients', 'heating_season', 'step_hours')
+    STEADY_STATE  = ()
+
     def __init__(self, model):
         super().__init__(model)
-        self.consumption = 0.0  # Вт·ч за последний час
+        self.consumption = 0.0  # Вт·ч за последний шаг
 
     def step(self):
-        dt       = self.model.current_datetime
+        m, d     = self.model.current_month, self.model.current_day
+        step_h   = self.model.step_hours
         occ      = min(self.model.hospitalized, self.BEDS_TOTAL) / self.BEDS_TOTAL
         patients = getattr(self.model, 'patients', 0) / max(1, self.BEDS_TOTAL)
 
         # 1) Тепло: только в отопительный сезон, равномерно
-        if  (dt.month == 10 and dt.day >= 15) or (11 <= dt.month <= 12) \
-          or (1 <= dt.month <= 3) or (dt.month == 4 and dt.day <= 15):
-            heat_kWh = self._HEAT_HOURLY_NORM
+        if  (m == 10 and d >= 15) or (11 <= m <= 12) \
+          or (1 <= m <= 3) or (m == 4 and d <= 15):
+            heat_kWh = self._HEAT_HOURLY_NORM * step_h
         else:
             heat_kWh = 0.0
 
@@ -42,13 +47,13 @@ class HospitalBuildingAgent(Agent):
         #    – операции/оборудование — около 20 % электропотребления :contentReference[oaicite:3]{index=3}
         dynamic_factor = 1 + 0.56 * occ + 0.20 * patients
 
-        el_kWh = base_el * dynamic_factor
+        el_kWh = base_el * dynamic_factor * step_h
 
         # Сохраняем итог Вт·ч
         total_kWh       = heat_kWh + el_kWh
         self.consumption = total_kWh * 1000
 
-        # print(f"[Hospital {self.unique_id} {dt:%Y-%m-%d %H}] "
+        # print(f"[Hospital {self.unique_id} {self.model.current_datetime:%Y-%m-%d %H}] "
         #       f"occ={occ:.2f}  patients={patients:.2f}  "
         #       f"heat={heat_kWh:.1f}kWh  el={el_kWh:.1f}kWh")
 
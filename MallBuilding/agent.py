@@ -2,11 +2,15 @@ import os
 import pickle
 import numpy as np
 import pandas as pd
+from functools import lru_cache
 from mesa import Agent
 
 
+@lru_cache(maxsize=None)
 def load_clf(path: str):
-    return pickle.load(open(path, 'rb'))
+    # Модель одна на процесс: агенты только вызывают predict
+    with open(path, 'rb') as f:
+        return pickle.load(f)
 
 class MallAgent(Agent):
     """
@@ -57,15 +61,15 @@ class MallAgent(Agent):
         self.heat_consumption = 0.0      # Вт
         self.consumption = 0.0
 
-    def predict_occupancy(self) -> float:
+    def predict_occupancy(self, hours=None):
         """
         Предсказывает occupancy_rate по модели, используя признаки:
         T_out, day_off, циклические hour, day_of_week, month.
+        Без hours — число для часа текущего шага, иначе массив по часам hours.
         """
-        dt = self.model.current_datetime
-        hour = dt.hour
-        dow = dt.weekday()
-        month = dt.month
+        hour = np.atleast_1d(self.model.current_hour if hours is None else hours)
+        dow = self.model.current_dow
+        month = self.model.current_month
         feats = {
             'T_out':     self.model.current_T_out,
             'day_off':   int(self.model.current_day_off),
@@ -76,12 +80,12 @@ class MallAgent(Agent):
             'month_sin': np.sin(2 * np.pi * (month - 1) / 12),
             'month_cos': np.cos(2 * np.pi * (month - 1) / 12)
         }
-        X = pd.DataFrame([feats])
-        return self.occ_clf.predict(X)[0]
+        X = pd.DataFrame(feats, index=range(len(hour)))
+        pred = self.occ_clf.predict(X)
+        return pred[0] if hours is None else pred
 
-    def in_heating_season(self, dt) -> bool:
-        """Проверяет, в отопительном ли сезоне дата dt."""
-        m, d = dt.month, dt.day
+    def in_heating_season(self, m, d) -> bool:
+        """Проверяет, в отопительном ли сезоне день d месяца m."""
         sm, sd = self.HEAT_START
         em, ed = self.HEAT_STOP
         # от 15 октября до конца года
@@ -91,35 +95,34 @@ class MallAgent(Agent):
         return False
 
     def step(self):
-        dt = self.model.current_datetime
+        # Нагрузки считаются по часам, которые покрывает шаг (1 час или сутки),
+        # и умножаются на длительность: consumption — энергия за шаг
         T_out = self.model.current_T_out
-        it_load = self.it_density * self.floor_area
-        other_density = self.other_density * self.floor_area
+        step_h = self.model.step_hours
+        hours = self.model.step_hours_of_day
+        w = self.model.step_hour_weight
+        it_load = self.it_density * self.floor_area * step_h
+        other_density = self.other_density * self.floor_area * step_h
         # 1) Прогноз occupancy_rate
-        occ = self.predict_occupancy() / 100
+        occ = self.predict_occupancy(hours) / 100
+        is_open = (self.opening_hour <= hours) & (hours < self.closing_hour)
 
         # 2) Освещение
-        if self.opening_hour <= dt.hour < self.closing_hour:
-            light_d = self.lighting_density
-        else:
-            light_d = self.night_lighting_density
-        lighting_load = light_d * self.floor_area
+        light_d = np.where(is_open, self.lighting_density, self.night_lighting_density)
+        lighting_load = (light_d * self.floor_area).sum() * w
 
         # 3) Оборудование арендаторов
-        equipment_load = self.equipment_density * self.floor_area * (0.2 if occ < 0.2 else occ) 
+        equipment_load = (self.equipment_density * self.floor_area * np.where(occ < 0.2, 0.2, occ)).sum() * w
 
         # 4) Эскалаторы
-        if self.opening_hour <= dt.hour < self.closing_hour:
-            power = self.escalator_peak_power if occ > 0.1 else self.escalator_idle_power
-            escalator_load = power * self.escalator_count
-        else:
-            escalator_load = 0
+        power = np.where(occ > 0.1, self.escalator_peak_power, self.escalator_idle_power)
+        escalator_load = np.where(is_open, power * self.escalator_count, 0).sum() * w
 
         # 5) Охлаждение
-        cooling_load = self.cooling_density * self.floor_area if T_out > 24 else 0
+        cooling_load = self.cooling_density * self.floor_area * step_h if T_out > 24 else 0
 
         # 6) Вентиляция (круглосуточно)
-        ventilation_load = self.ventilation_density * self.floor_area
+        ventilation_load = self.ventilation_density * self.floor_area * step_h
 
         # Итоговое электричество
         self.electric_consumption = (
@@ -128,13 +131,13 @@ class MallAgent(Agent):
         )
 
         # 7) Отопление (тепловая сеть)
-        if self.in_heating_season(dt):
-            self.heat_consumption = self.heating_density * self.floor_area
+        if self.in_heating_season(self.model.current_month, self.model.current_day):
+            self.heat_consumption = self.heating_density * self.floor_area * step_h
         else:
             self.heat_consumption = 0
         
         self.consumption = (self.electric_consumption + self.heat_consumption) / 1000.0  
 
         # # Логирование
-        # print(f"[Mall {self.unique_id} | {dt}] Elec={self.electric_consumption:.0f} W, "
+        # print(f"[Mall {self.unique_id} | {self.model.current_datetime}] Elec={self.electric_consumption:.0f} W, "
         #       f"Heat={self.heat_consumption:.0f} W, Occ={occ:.2f}, Total={self.consumption} W")
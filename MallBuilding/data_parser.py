@@ -11,13 +11,22 @@ build_mall_traffic_dataset.py
     - occupancy_rate: относительная заполняемость ТРЦ (0–100 %)
     - day_off: 1 для выходных и официальных праздников РФ, иначе 0
 
+Источники данных подключаемые: профиль недели BestTime (week_raw) и погода
+Meteostat оборачиваются файловым кэшем в MallBuilding/data/cache. Если кэш
+заполнен (или восстановлен из готового датасета через seed_cache_from_dataset),
+сборка идёт без сети и полностью детерминированно:
+    python MallBuilding/data_parser.py --offline
+
 Требует:
     pip install requests pandas meteostat holidays python-dateutil pytz
 """
 
 import os
 import sys
+import json
+import argparse
 import requests
+import numpy as np
 import pandas as pd
 import pytz
 from datetime import datetime
@@ -39,6 +48,7 @@ TIMEZONE = "Europe/Moscow"
 TZ = pytz.timezone(TIMEZONE)
 
 OUT_DIR = "./MallBuilding/data"
+CACHE_DIR = os.path.join(OUT_DIR, "cache")
 LAT, LON = 55.75, 37.62  # для Meteostat
 
 # Календарь праздников РФ
@@ -90,33 +100,117 @@ def build_time_series(
     )
     idx = idx_aware.tz_localize(None)
 
-    # Для каждой метки рассчитываем индекс в week_raw
-    visits = []
-    for dt in idx:
-        N = dt.weekday() * 24 + dt.hour
-        j = (N - window_start) % 168
-        visits.append(week_raw[j])
+    # Индекс в week_raw для всех меток сразу: час недели со сдвигом окна
+    hour_of_week = idx.weekday * 24 + idx.hour
+    j = (np.asarray(hour_of_week) - window_start) % 168
+    visits = np.asarray(week_raw)[j]
 
     return pd.DataFrame({"datetime": idx, "occupancy_rate": visits})
 
-def fetch_temperature(df: pd.DataFrame) -> pd.DataFrame:
+def fetch_temperature(df: pd.DataFrame, weather_source=None) -> pd.DataFrame:
     start, end = df.datetime.min(), df.datetime.max()
+    if weather_source is None:
+        weather_source = meteostat_weather_source
+    wx = weather_source(start, end)
+    return df.merge(wx, on="datetime", how="left")
+
+# ------------------------ Источники данных и кэш ----------------------------------------
+# Источник профиля недели — вызываемый объект без аргументов -> (week_raw, window_start).
+# Источник погоды — вызываемый объект (start, end) -> DataFrame[datetime, T_out].
+
+def besttime_week_source() -> tuple[list[int], int]:
+    """Живой источник: создаёт прогноз BestTime и забирает 168-часовой профиль."""
+    venue_id = new_forecast(MALL_NAME, MALL_ADDRESS)
+    return get_week_raw_and_window(venue_id)
+
+def meteostat_weather_source(start: datetime, end: datetime) -> pd.DataFrame:
+    """Живой источник: почасовая температура Meteostat для точки (LAT, LON)."""
     wx = Hourly(Point(LAT, LON), start, end).fetch().reset_index()
     temp_col = next(c for c in ("temp", "tavg") if c in wx.columns)
-    wx = wx[["time", temp_col]].rename(columns={"time": "datetime", temp_col: "T_out"})
-    return df.merge(wx, on="datetime", how="left")
+    return wx[["time", temp_col]].rename(columns={"time": "datetime", temp_col: "T_out"})
+
+def _week_cache_path(cache_dir: str) -> str:
+    return os.path.join(cache_dir, "besttime_week_raw.json")
+
+def _weather_cache_path(cache_dir: str, start: datetime, end: datetime) -> str:
+    name = f"weather_{LAT:.2f}_{LON:.2f}_{start:%Y%m%d%H}_{end:%Y%m%d%H}.csv"
+    return os.path.join(cache_dir, name)
+
+def cached_week_source(source=besttime_week_source, cache_dir: str = CACHE_DIR,
+                       offline: bool = False):
+    """
+    Оборачивает источник профиля недели файловым кэшем (JSON).
+    Кэш читается, если он есть; иначе вызывается source и результат сохраняется.
+    В offline-режиме отсутствие кэша — ошибка, сеть не трогается.
+    """
+    path = _week_cache_path(cache_dir)
+
+    def load() -> tuple[list[int], int]:
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                payload = json.load(f)
+            return payload["week_raw"], int(payload["window_start"])
+        if offline:
+            raise RuntimeError(f"Offline: нет кэша профиля недели {path}")
+        week_raw, window_start = source()
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"week_raw": list(map(int, week_raw)),
+                       "window_start": int(window_start)}, f)
+        return week_raw, window_start
+
+    return load
+
+def cached_weather_source(source=meteostat_weather_source, cache_dir: str = CACHE_DIR,
+                          offline: bool = False):
+    """
+    Оборачивает источник погоды файловым кэшем (CSV на пару start/end).
+    Поведение аналогично cached_week_source.
+    """
+    def load(start: datetime, end: datetime) -> pd.DataFrame:
+        path = _weather_cache_path(cache_dir, start, end)
+        if os.path.isfile(path):
+            return pd.read_csv(path, parse_dates=["datetime"])
+        if offline:
+            raise RuntimeError(f"Offline: нет кэша погоды {path}")
+        wx = source(start, end)
+        os.makedirs(cache_dir, exist_ok=True)
+        wx.to_csv(path, index=False)
+        return wx
+
+    return load
+
+def seed_cache_from_dataset(path: str, cache_dir: str = CACHE_DIR) -> None:
+    """
+    Восстанавливает кэш (профиль недели и погоду) из ранее собранного датасета,
+    чтобы пересборка работала без сети. Профиль пишется с window_start = 0.
+    """
+    df = pd.read_csv(path, parse_dates=["datetime"])
+    hour_of_week = df.datetime.dt.weekday * 24 + df.datetime.dt.hour
+    profile = df.groupby(hour_of_week)["occupancy_rate"].first()
+    if len(profile) != 168:
+        raise RuntimeError(f"Датасет {path} покрывает не все 168 часов недели")
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(_week_cache_path(cache_dir), "w", encoding="utf-8") as f:
+        json.dump({"week_raw": profile.astype(int).tolist(), "window_start": 0}, f)
+
+    start, end = df.datetime.min().to_pydatetime(), df.datetime.max().to_pydatetime()
+    df[["datetime", "T_out"]].to_csv(_weather_cache_path(cache_dir, start, end), index=False)
 
 # ---------------------------- ОСНОВНОЙ СЦЕНАРИЙ ------------------------------------------
-def build_dataset():
-    # 1) Получаем прогноз
-    venue_id = new_forecast(MALL_NAME, MALL_ADDRESS)
-    week_raw, window_start = get_week_raw_and_window(venue_id)
+def build_dataset(week_source=None, weather_source=None, offline: bool = False):
+    # 1) Получаем прогноз (по умолчанию — через кэш)
+    if week_source is None:
+        week_source = cached_week_source(offline=offline)
+    if weather_source is None:
+        weather_source = cached_weather_source(offline=offline)
+    week_raw, window_start = week_source()
 
     # 2) Строим временной ряд occupancy_rate
     df = build_time_series(week_raw, window_start, START_LOCAL, END_LOCAL)
 
     # 3) Добавляем температуру и признак выходного/праздника
-    df = fetch_temperature(df)
+    df = fetch_temperature(df, weather_source)
     df["day_off"] = (
         df.datetime.dt.weekday.isin([5, 6]) |
         df.datetime.dt.date.isin(RU_HOLI)
@@ -130,3 +224,16 @@ def build_dataset():
     out_path = os.path.join(OUT_DIR, "mall_traffic_2024.csv")
     df.to_csv(out_path, index=False)
     print(f"✅ Dataset saved ({len(df):,} rows) → {out_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сборка датасета трафика ТРЦ")
+    parser.add_argument("--offline", action="store_true",
+                        help="не обращаться к сети, использовать только кэш")
+    parser.add_argument("--seed-cache", metavar="CSV",
+                        help="заполнить кэш из готового датасета и выйти")
+    args = parser.parse_args()
+    if args.seed_cache:
+        seed_cache_from_dataset(args.seed_cache)
+        sys.exit(0)
+    build_dataset(offline=args.offline)
@@ -6,6 +6,14 @@ train_mall_model.py
 инженерии признаков с учётом цикличности времени,
 обучения нескольких моделей регрессии,
 сравнения их через графики, выбора лучшей по RMSE и сохранения её на диск.
+
+Для каждой модели и облегчённых вариантов лучшего ансамбля (усечённый,
+дистиллированный, точная таблица по час × день недели × месяц × day_off
+× интервалы T_out) записываются задержка predict и размер pickle
+(model_select.py); с бюджетом RMSE выбирается самый быстрый кандидат.
+
+Признаки кэшируются (feature_store.py); когда в датасет дописаны новые
+часы, update_mall_model дообучает сохранённую модель.
 """
 import os
 import pickle
@@ -17,10 +25,35 @@ from sklearn.metrics import mean_squared_error, r2_score
 from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 
-
-def load_data(path: str) -> pd.DataFrame:
-    """Загружает CSV, парсит datetime и добавляет циклические признаки."""
-    df = pd.read_csv(path, parse_dates=['datetime'])
+import feature_store
+import model_select
+from model_select import CyclicAxis, ValueAxis, LookupRegressor
+
+FEATURES = [
+    'T_out', 'day_off',
+    'hour_sin', 'hour_cos',
+    'dow_sin', 'dow_cos',
+    'month_sin', 'month_cos'
+]
+TARGET = 'occupancy_rate'
+# Дискретные признаки и непрерывный признак табличного варианта модели
+LOOKUP_AXES = [
+    CyclicAxis('hour_sin', 'hour_cos', 24),
+    CyclicAxis('dow_sin', 'dow_cos', 7),
+    CyclicAxis('month_sin', 'month_cos', 12),
+    ValueAxis('day_off', [0, 1]),
+]
+LOOKUP_CONTINUOUS = 'T_out'
+# Меняется при изменении add_features (кэш прежней версии не используется)
+FEATURES_VERSION = 1
+
+
+def read_traffic(path) -> pd.DataFrame:
+    return pd.read_csv(path, parse_dates=['datetime'])
+
+
+def add_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Добавляет циклические признаки времени; индекс — datetime."""
     df['hour'] = df['datetime'].dt.hour
     df['day_of_week'] = df['datetime'].dt.weekday
     df['month'] = df['datetime'].dt.month
@@ -31,16 +64,25 @@ def load_data(path: str) -> pd.DataFrame:
     df['dow_cos'] = np.cos(2 * np.pi * df['day_of_week'] / 7)
     df['month_sin'] = np.sin(2 * np.pi * (df['month'] - 1) / 12)
     df['month_cos'] = np.cos(2 * np.pi * (df['month'] - 1) / 12)
-    return df
+    return df.set_index('datetime')
 
 
-def evaluate_model(name: str, model, X_tr, X_te, y_tr, y_te):
-    """Тренирует модель, возвращает RMSE и R2."""
-    model.fit(X_tr, y_tr)
+def load_data(path: str) -> pd.DataFrame:
+    """Датасет с циклическими признаками — из кэша признаков (строится при изменении файла)."""
+    df = feature_store.load_features('mall', path, add_features, read=read_traffic,
+                                     version=FEATURES_VERSION)
+    return df.reset_index()
+
+
+def evaluate_model(name: str, model, X_tr, X_te, y_tr, y_te, fit: bool = True):
+    """Тренирует модель (fit=False — уже обучена), возвращает RMSE, R2, задержку и размер."""
+    if fit:
+        model.fit(X_tr, y_tr)
     preds = model.predict(X_te)
     rmse = mean_squared_error(y_te, preds, squared=False)
     r2 = r2_score(y_te, preds)
-    return {'name': name, 'model': model, 'rmse': rmse, 'r2': r2}
+    return {'name': name, 'model': model, 'rmse': rmse, 'r2': r2,
+            **model_select.measure(model, X_te)}
 
 
 def plot_comparison(results, output_dir):
@@ -71,7 +113,13 @@ def plot_best_scatter(best, X_te, y_te, output_dir):
     plt.show()
 
 
-def train_mall_models():
+def train_mall_models(rmse_budget: float | None = None, rmse_tolerance: float | None = None,
+                      objective: str = 'latency_row_ms'):
+    """
+    Обучает и сравнивает модели; без бюджета сохраняет модель с наименьшим
+    RMSE, с бюджетом (rmse_budget или лучший RMSE × (1 + rmse_tolerance)) —
+    кандидата с наименьшим objective (model_select.select_model).
+    """
     # Пути
     base = os.getcwd()
     data_path = os.path.join(base, 'MallBuilding', 'data', 'mall_traffic_synthetic.csv')
@@ -81,15 +129,8 @@ def train_mall_models():
 
     # Загрузка данных
     df = load_data(data_path)
-    features = [
-        'T_out', 'day_off',
-        'hour_sin', 'hour_cos',
-        'dow_sin', 'dow_cos',
-        'month_sin', 'month_cos'
-    ]
-    target = 'occupancy_rate'
-    X = df[features]
-    y = df[target]
+    X = df[FEATURES]
+    y = df[TARGET]
 
     # Разбиение
     X_train, X_test, y_train, y_test = train_test_split(
@@ -108,18 +149,70 @@ def train_mall_models():
     print('Evaluating models:')
     for name, mdl in model_defs.items():
         res = evaluate_model(name, mdl, X_train, X_test, y_train, y_test)
-        print(f"{res['name']:20} RMSE={res['rmse']:.3f}  R2={res['r2']:.3f}")
+        print(model_select.format_result(res))
+        results.append(res)
+
+    # Облегчённые варианты лучшей по RMSE модели
+    top = min(results, key=lambda x: x['rmse'])
+    for name, mdl in model_select.variants(top['model'], X_train,
+                                           LOOKUP_AXES, LOOKUP_CONTINUOUS).items():
+        res = evaluate_model(f"{top['name']}/{name}", mdl, X_train, X_test, y_train, y_test,
+                             fit=False)
+        res['variant'] = True
+        print(model_select.format_result(res))
         results.append(res)
 
     # Выбор лучшей модели
-    best = min(results, key=lambda x: x['rmse'])
+    best = model_select.select_model(results, rmse_budget, rmse_tolerance, objective)
     print(f"\nBest model: {best['name']} (RMSE={best['rmse']:.3f})")
 
-    # Сохранение модели
+    # Сохранение модели; trained_rows_ — сколько строк данных было при обучении
+    best['model'].trained_rows_ = len(X)
+    # Критерии выбора — чтобы полное переобучение при обновлении выбирало так же
+    best['model'].selection_ = {'rmse_budget': rmse_budget, 'rmse_tolerance': rmse_tolerance,
+                                'objective': objective}
     with open(model_path, 'wb') as f:
         pickle.dump(best['model'], f)
     print(f"Model saved to {model_path}")
 
+    metrics_path = os.path.join(base, 'MallBuilding', 'trained_models', 'model_metrics.txt')
+    with open(metrics_path, 'w') as mf:
+        for r in results:
+            mf.write(f"{r['name']}: RMSE={r['rmse']:.3f}, R2={r['r2']:.3f}, "
+                     f"latency_row={r['latency_row_ms']:.3f} ms, "
+                     f"latency_batch={r['latency_batch_ms']:.2f} ms, size={r['size_kb']:.1f} KB\n")
+
     # Визуализация
     plot_comparison(results, plots_dir)
     plot_best_scatter(best, X_test, y_test, plots_dir)
+
+
+def update_mall_model(n_estimators: int = 20):
+    """
+    Дообучает сохранённую модель на часах, дописанных в датасет после
+    обучения (feature_store.extend_model); без сохранённой модели или без
+    отметки trained_rows_, а также для табличной модели (её нельзя
+    дообучить) — полное обучение train_mall_models с критериями выбора,
+    сохранёнными в модели (selection_: бюджет RMSE и objective).
+    """
+    base = os.getcwd()
+    data_path = os.path.join(base, 'MallBuilding', 'data', 'mall_traffic_synthetic.csv')
+    model_path = os.path.join(base, 'MallBuilding', 'trained_models', 'best_mall_model.pkl')
+    if not os.path.isfile(model_path):
+        return train_mall_models()
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    if not hasattr(model, 'trained_rows_') or isinstance(model, LookupRegressor):
+        return train_mall_models(**getattr(model, 'selection_', {}))
+
+    df = load_data(data_path)
+    X, y = df[FEATURES], df[TARGET]
+    n_new = len(X) - model.trained_rows_
+    if n_new <= 0:
+        print("Новых данных нет, модель не изменена")
+        return
+    model = feature_store.extend_model(model, X, y, n_new, n_estimators)
+    rmse = mean_squared_error(y.iloc[-n_new:], model.predict(X.iloc[-n_new:]), squared=False)
+    print(f"{type(model).__name__}: +{n_new} rows, RMSE on new rows={rmse:.3f}")
+    with open(model_path, 'wb') as f:
+        pickle.dump(model, f)
@@ -16,7 +16,6 @@ ELEV_TRIP_KWH  0.06   # KONE MonoSpace DX, ISO A-class
 FULL_PRES_TR   180    # ISO 25745 cat-3
 """
 
-import datetime as _dt
 from mesa import Agent
 
 class ModernResidentialBuildingAgent(Agent):
@@ -28,14 +27,17 @@ class ModernResidentialBuildingAgent(Agent):
     ELEV_TRIP_KWH = 0.06
     FULL_PRES_TRIPS = 180
     HEAT_START, HEAT_STOP = (10,15), (4,15)
+    # Потребление меняется только вместе с этими входами (для skip_idle модели)
+    STEADY_INPUTS = ("presence_in_building", "heating_season", "step_hours")
+    STEADY_STATE  = ("_last_p",)
 
     def __init__(self, model):
         super().__init__(model)
         self._last_p: float | None = None
-        self.consumption = 0.0  # W
+        self.consumption = 0.0  # Wh за шаг
 
-    def _heating(self, dt: _dt.datetime):
-        m_d = (dt.month, dt.day)
+    def _heating(self, month, day):
+        m_d = (month, day)
         return (m_d >= ModernResidentialBuildingAgent.HEAT_START) or (
                m_d <= ModernResidentialBuildingAgent.HEAT_STOP)
 
@@ -49,18 +51,19 @@ class ModernResidentialBuildingAgent(Agent):
         return trips * self.ELEV_TRIP_KWH
 
 
-    def _light_kw(self, delta_p):
-        return self.LIGHT_STBY_KW + self.LIGHT_DELTA_KW * delta_p
+    def _light_kw(self, delta_p, hours=1.0):
+        # дежурный свет — за всю длительность шага, добавка — на изменение присутствия
+        return self.LIGHT_STBY_KW * hours + self.LIGHT_DELTA_KW * delta_p
 
 
     def step(self):
-        dt   = self.model.current_datetime
+        h    = self.model.step_hours
         prs  = max(0.0, min(getattr(self.model, "presence_in_building", 1.0), 1.0))
         dprs = 0.0 if self._last_p is None else abs(prs - self._last_p)
-        kw   = (self._light_kw(dprs) + self.FAN_KW + self.IT_KW +
-                (self.PUMP_KW if self._heating(dt) else 0.0) +
+        kwh  = (self._light_kw(dprs, h) + self.FAN_KW * h + self.IT_KW * h +
+                (self.PUMP_KW * h if self._heating(self.model.current_month, self.model.current_day) else 0.0) +
                 self._lift_kw(prs))
-        self.consumption = kw * 1_000
+        self.consumption = kwh * 1_000
         if getattr(self.model, "verbose", False):
-            print(f"[Modern {self.unique_id} {dt:%F %H}] pres={prs:.2f} "
-                  f"Δp={dprs:.2f} load={kw:.2f} kW")
+            print(f"[Modern {self.unique_id} {self.model.current_datetime:%F %H:%M}] pres={prs:.2f} "
+                  f"Δp={dprs:.2f} load={kwh:.2f} kWh")
@@ -1,16 +1,20 @@
-import os
-import numpy as np
-import pandas as pd
 from mesa import Agent
 
 class OfficeBuildingAgent(Agent):
-    def __init__(self, model):
+    # Распределение площади офиса (м²)
+    AREA_CHOICES = [500, 1000, 2000, 5000]
+    AREA_PROBS   = [0.3, 0.4, 0.2, 0.1]
+
+    def __init__(self, model, area=None):
         super().__init__(model)
-        rng = np.random.RandomState(200 + self.unique_id)
 
-        # Фиксированная площадь офиса (м²)
+        # Фиксированная площадь офиса (м²); без area — случайная из AREA_CHOICES
+        # (поток здания из seed модели: тип и номер офиса, не unique_id)
         # Норма на одного: 6.5 м²/чел (СНиП)
-        self.area = float(rng.choice([500, 1000, 2000, 5000], p=[0.3,0.4,0.2,0.1]))
+        if area is None:
+            rng = model.agent_rng(self)
+            area = rng.choice(self.AREA_CHOICES, p=self.AREA_PROBS)
+        self.area = float(area)
         self.capacity = self.area / 6.5  # вместимость в чел
 
         # Базовые удельные плотности (W/m²)
@@ -23,33 +27,34 @@ class OfficeBuildingAgent(Agent):
         self.consumption = 0
 
     def step(self):
-        dt = self.model.current_datetime
-        hour = dt.hour
+        step_h = self.model.step_hours
 
         # 2) Определяем ppl
         ppl = self.model.current_office_population / self.model.num_office_agents
 
         # 3) Отопительный сезон: 15 октября–15 апреля
-        m, d = dt.month, dt.day
+        m, d = self.model.current_month, self.model.current_day
         heating_active = ((m == 10 and d >= 15) or (m > 10) or (m < 4) or (m == 4 and d <= 15))
-        heating_load = self.area * self.heating_pump_density if heating_active else 0.0
+        heating_load = self.area * self.heating_pump_density * step_h if heating_active else 0.0
 
         # 4) Ночная переработка (22:00–7:00) – потребление падает
-        night = True if (hour >= 22 or hour < 7) else False
-        vent_factor = 0.3 if night else 1.0   # 30% мощности вентиляторов ночью
-        light_density = self.lighting_night_density if night else self.lighting_day_density
+        night_h = self.model.window_hours(22, 7)  # часы шага, пришедшиеся на ночь
+        day_h   = step_h - night_h
+        # 30% мощности вентиляторов ночью
+        vent_hours  = 0.3 * night_h + 1.0 * day_h
+        light_hours = self.lighting_night_density * night_h + self.lighting_day_density * day_h
 
 
-        # 5) Расчёт нагрузок
-        ventilation_load = self.area * self.vent_fan_density * vent_factor
-        lighting_load    = self.area * light_density
-        plug_load        = ppl * self.per_pc_load
+        # 5) Расчёт нагрузок за шаг
+        ventilation_load = self.area * self.vent_fan_density * vent_hours
+        lighting_load    = self.area * light_hours
+        plug_load        = ppl * self.per_pc_load * step_h
 
-        # 6) Суммарная мгновенная мощность (W)
+        # 6) Суммарная энергия за шаг (Вт·ч; при часовом шаге равна мощности в W)
         self.consumption = heating_load + ventilation_load + lighting_load + plug_load
 
         # print(
-        #     f"[Office {self.unique_id} | {dt}] "
+        #     f"[Office {self.unique_id} | {self.model.current_datetime}] "
         #     f"Heat={'on' if heating_active else 'off'}({heating_load:.0f}W), "
         #     f"Vent={ventilation_load:.0f}W, Light={lighting_load:.0f}W, "
         #     f"Plug={plug_load:.0f}W Total={self.consumption:.0f}W"
@@ -13,7 +13,6 @@ Elevator model
 ISO 25745-2 cat.-2 ⇒ 110-130 trips day-¹ (two cars).  
 """
 
-import datetime as _dt
 from mesa import Agent
 
 class ResidentialBuildingAgent(Agent):
@@ -24,14 +23,17 @@ class ResidentialBuildingAgent(Agent):
     FULL_PRESENCE_TRIPS = 120       # ISO cat-2 mid-value
     ELEV_TRIP_KWH       = 0.10      # KONE MonoSpace EPD
     HEAT_START, HEAT_STOP = (10,15), (4,15)
+    # Потребление меняется только вместе с этими входами (для skip_idle модели)
+    STEADY_INPUTS = ("presence_in_building", "heating_season", "step_hours")
+    STEADY_STATE  = ("_last_p",)
 
     def __init__(self, model):
         super().__init__(model)
         self._last_p: float | None = None
-        self.consumption = 0.0  # W
+        self.consumption = 0.0  # Wh за шаг
 
-    def _heating(self, dt: _dt.datetime):
-        m_d = (dt.month, dt.day)
+    def _heating(self, month, day):
+        m_d = (month, day)
         return (m_d >= ResidentialBuildingAgent.HEAT_START) or (
                m_d <= ResidentialBuildingAgent.HEAT_STOP)
 
@@ -41,14 +43,15 @@ class ResidentialBuildingAgent(Agent):
             return 0.0
         trips = abs(p_now - self._last_p) * self.FULL_PRESENCE_TRIPS
         self._last_p = p_now
-        return trips * self.ELEV_TRIP_KWH  # kWh/1 h == kW
+        return trips * self.ELEV_TRIP_KWH  # kWh за шаг (для 1 h == kW)
 
     def step(self):
-        dt  = self.model.current_datetime
+        h   = self.model.step_hours
         prs = max(0.0, min(getattr(self.model, "presence_in_building", 1.0), 1.0))
-        kw  = (self.LIGHT_KW + self.FAN_KW + self.IT_KW +
-               (self.PUMP_KW if self._heating(dt) else 0.0) +
+        # постоянные нагрузки — мощность × длительность шага, лифт — по числу поездок
+        kwh = (self.LIGHT_KW * h + self.FAN_KW * h + self.IT_KW * h +
+               (self.PUMP_KW * h if self._heating(self.model.current_month, self.model.current_day) else 0.0) +
                self._lift_kw(prs))
-        self.consumption = kw * 1_000
+        self.consumption = kwh * 1_000
         if getattr(self.model, "verbose", False):
-            print(f"[Old {self.unique_id} {dt:%F %H}] pres={prs:.2f} load={kw:.2f} kW")
+            print(f"[Old {self.unique_id} {self.model.current_datetime:%F %H:%M}] pres={prs:.2f} load={kwh:.2f} kWh")
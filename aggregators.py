@@ -0,0 +1,233 @@
+"""
+Потоковые агрегаторы нагрузки, обновляемые внутри EnergyConsumptionModel.step.
+
+После того как агенты сделали шаг, модель один раз суммирует consumption
+по (AgentType, район) и передаёт агрегаторам словарь этих сумм вместе с
+меткой шага. Состояние агрегаторов не зависит от числа зданий, поэтому
+для больших прогонов можно отключить сбор по агентам (collect_agents=False).
+
+consumption — энергия за шаг (Вт·ч); мощность = энергия / step_hours.
+
+    model = EnergyConsumptionModel(aggregators=[TotalLoad(), TypeLoad(), RollingPeak(24), PeakAnalytics()],
+                                   collect_agents=False)
+"""
+import heapq
+from collections import defaultdict, deque
+import pandas as pd
+
+# Имя группы для суммарной нагрузки всех зданий
+TOTAL = 'total'
+
+
+class Aggregator:
+    """Базовый агрегатор: update на каждом шаге, result — итог в pandas."""
+    name = 'aggregator'
+
+    def update(self, stamp, loads: dict, step_hours: float):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+
+class TotalLoad(Aggregator):
+    """Суммарная энергия всех зданий за каждый шаг."""
+    name = 'total'
+
+    def __init__(self):
+        self.stamps, self.values = [], []
+
+    def update(self, stamp, loads, step_hours):
+        self.stamps.append(stamp)
+        self.values.append(sum(loads.values()))
+
+    def result(self) -> pd.Series:
+        return pd.Series(self.values, index=pd.DatetimeIndex(self.stamps, name='datetime'),
+                         name='consumption')
+
+
+class _GroupLoad(Aggregator):
+    """Энергия за шаг по одной из частей ключа (AgentType или район)."""
+    key_index = 0
+
+    def __init__(self):
+        self.stamps = []
+        self.values = defaultdict(list)
+
+    def update(self, stamp, loads, step_hours):
+        sums = defaultdict(float)
+        for key, value in loads.items():
+            sums[key[self.key_index]] += value
+        n = len(self.stamps)
+        for group, value in sums.items():
+            series = self.values[group]
+            series.extend([0.0] * (n - len(series)))  # группа появилась не с первого шага
+            series.append(value)
+        self.stamps.append(stamp)
+
+    def result(self) -> pd.DataFrame:
+        n = len(self.stamps)
+        data = {g: v + [0.0] * (n - len(v)) for g, v in self.values.items()}
+        return pd.DataFrame(data, index=pd.DatetimeIndex(self.stamps, name='datetime'))
+
+
+class TypeLoad(_GroupLoad):
+    """Энергия за шаг по AgentType."""
+    name = 'by_type'
+    key_index = 0
+
+
+class DistrictLoad(_GroupLoad):
+    """Энергия за шаг по районам."""
+    name = 'by_district'
+    key_index = 1
+
+
+class RollingPeak(Aggregator):
+    """
+    Пик суммарной мощности, усреднённой по скользящему окну из window шагов
+    (window=1 — пик мгновенной мощности шага).
+    """
+    name = 'rolling_peak'
+
+    def __init__(self, window: int = 1):
+        self.window = window
+        self._buf = deque()
+        self._sum = 0.0
+        self.peak = float('-inf')
+        self.peak_stamp = None
+
+    def update(self, stamp, loads, step_hours):
+        power = sum(loads.values()) / step_hours
+        self._buf.append(power)
+        self._sum += power
+        if len(self._buf) > self.window:
+            self._sum -= self._buf.popleft()
+        if len(self._buf) == self.window and self._sum / self.window > self.peak:
+            self.peak = self._sum / self.window
+            self.peak_stamp = stamp  # конец окна
+
+    def result(self) -> pd.Series:
+        return pd.Series({'peak': self.peak, 'window_end': self.peak_stamp})
+
+
+class DailyEnergy(Aggregator):
+    """Суммарная энергия по календарным дням."""
+    name = 'daily_energy'
+
+    def __init__(self):
+        self.days = defaultdict(float)
+
+    def update(self, stamp, loads, step_hours):
+        self.days[pd.Timestamp(stamp).normalize()] += sum(loads.values())
+
+    def result(self) -> pd.Series:
+        s = pd.Series(self.days, name='consumption').sort_index()
+        s.index.name = 'date'
+        return s
+
+
+class LoadDurationCurve(Aggregator):
+    """
+    Кривая продолжительности нагрузки по гистограмме суммарной мощности
+    с шагом bin_width: сколько часов мощность была не ниже каждого уровня.
+    """
+    name = 'load_duration'
+
+    def __init__(self, bin_width: float = 1000.0):
+        self.bin_width = bin_width
+        self.hours = defaultdict(float)
+
+    def update(self, stamp, loads, step_hours):
+        power = sum(loads.values()) / step_hours
+        self.hours[int(power // self.bin_width)] += step_hours
+
+    def result(self) -> pd.Series:
+        counts = pd.Series(self.hours).sort_index(ascending=False)
+        duration = counts.cumsum()
+        duration.index = duration.index * self.bin_width
+        duration.index.name = 'load'
+        return duration.sort_index().rename('hours_at_or_above')
+
+
+class PeakAnalytics(Aggregator):
+    """
+    Пиковые показатели за один проход по шагам, без хранения ряда:
+      - годовой пик суммарной мощности (по календарным годам);
+      - top_n шагов с наибольшей мощностью — всего и по группам
+        (ограниченные кучи размера top_n);
+      - коэффициент совмещения максимумов: пик суммы / сумма пиков частей.
+        На агрегатах части — группы (AgentType или районы, key_index);
+        если известны пики отдельных зданий (unit_peaks, см.
+        analysis.peak_analytics), то и внутри каждой группы;
+      - кривые продолжительности нагрузки — гистограммы мощности с шагом
+        bin_width, всего и по группам.
+    """
+    name = 'peaks'
+
+    def __init__(self, top_n: int = 10, key_index: int = 0, bin_width: float = 1000.0):
+        self.top_n = top_n
+        self.key_index = key_index
+        self.bin_width = bin_width
+        self.annual = {}                     # год → (мощность, метка)
+        self.top = defaultdict(list)         # группа → куча (мощность, метка)
+        self.peaks = defaultdict(float)      # группа → пик мощности
+        self.hours = defaultdict(lambda: defaultdict(float))  # группа → {корзина: часы}
+        self.unit_peaks = {}                 # группа → сумма пиков зданий группы
+
+    def update(self, stamp, loads, step_hours):
+        stamp = pd.Timestamp(stamp)
+        power = defaultdict(float)
+        for key, value in loads.items():
+            power[key[self.key_index]] += value / step_hours
+        power[TOTAL] = sum(power.values())
+
+        best = self.annual.get(stamp.year)
+        if best is None or power[TOTAL] > best[0]:
+            self.annual[stamp.year] = (power[TOTAL], stamp)
+        for group, value in power.items():
+            heap = self.top[group]
+            if len(heap) < self.top_n:
+                heapq.heappush(heap, (value, stamp))
+            elif value > heap[0][0]:
+                heapq.heapreplace(heap, (value, stamp))
+            if value > self.peaks[group]:
+                self.peaks[group] = value
+            self.hours[group][int(value // self.bin_width)] += step_hours
+
+    def coincidence(self) -> pd.Series:
+        """Пик суммы / сумма пиков частей: по группам (здания) и всего (группы)."""
+        factors = {group: self.peaks[group] / parts
+                   for group, parts in self.unit_peaks.items() if parts > 0}
+        parts = sum(v for g, v in self.peaks.items() if g != TOTAL)
+        if parts > 0:
+            factors[TOTAL] = self.peaks[TOTAL] / parts
+        return pd.Series(factors, name='coincidence_factor')
+
+    def load_duration(self) -> pd.DataFrame:
+        """Часы с мощностью не ниже уровня (индекс — уровень) по группам."""
+        curves = {}
+        for group, hours in self.hours.items():
+            counts = pd.Series(hours).sort_index(ascending=False).cumsum()
+            counts.index = counts.index * self.bin_width
+            curves[group] = counts
+        frame = pd.DataFrame(curves).sort_index()
+        frame.index.name = 'load'
+        # между уровнями группы — часы следующего уровня, выше её пика — 0
+        return frame.bfill().fillna(0.0)
+
+    def result(self) -> dict:
+        annual = pd.DataFrame([(y, p, s) for y, (p, s) in sorted(self.annual.items())],
+                              columns=['year', 'peak', 'datetime']).set_index('year')
+        top = pd.DataFrame(
+            [(group, rank, stamp, value)
+             for group, heap in self.top.items()
+             for rank, (value, stamp) in enumerate(sorted(heap, reverse=True), start=1)],
+            columns=['group', 'rank', 'datetime', 'power'],
+        )
+        return {
+            'annual_peak': annual,
+            'top_steps': top,
+            'coincidence': self.coincidence(),
+            'load_duration': self.load_duration(),
+        }
@@ -0,0 +1,61 @@
+"""
+Сопоставление произвольных меток времени со строками годовых рядов.
+
+Погода и план предприятия заданы на один (или несколько) лет. Чтобы
+модель могла идти дальше их границ, метки горизонта один раз переводятся
+в индексы строк ряда:
+  - по дню года (месяц, день, время суток; 29 февраля → 28 февраля) —
+    для погоды, где важен сезон;
+  - по часу недели — для плана предприятия, где важен ещё и день недели:
+    строка, найденная по дню года, сдвигается на ближайший (±3 дня)
+    тот же день недели.
+Метки, которые есть в ряду, сопоставляются сами с собой. Индекс -1 —
+соответствия нет (в ряду нет такого дня года).
+"""
+import numpy as np
+import pandas as pd
+
+
+def calendar_key(index: pd.DatetimeIndex) -> np.ndarray:
+    """Ключ (месяц, день, минута суток) без года; 29 февраля совпадает с 28-м."""
+    month = index.month.to_numpy()
+    day = index.day.to_numpy()
+    day = np.where((month == 2) & (day == 29), 28, day)
+    minute = index.hour.to_numpy() * 60 + index.minute.to_numpy()
+    return (month * 32 + day) * 1440 + minute
+
+
+def align_by_day_of_year(source: pd.DatetimeIndex, target) -> np.ndarray:
+    """
+    Индексы строк source для меток target: точное совпадение, иначе та же
+    дата и время суток (при нескольких годах в source — последний год).
+    """
+    target = pd.DatetimeIndex(target)
+    positions = source.get_indexer(target)
+    missing = positions < 0
+    if missing.any():
+        by_key = pd.Series(np.arange(len(source)), index=calendar_key(source))
+        by_key = by_key[~by_key.index.duplicated(keep='last')]
+        found = by_key.reindex(calendar_key(target[missing]))
+        positions[missing] = found.fillna(-1).to_numpy(dtype=np.int64)
+    return positions
+
+
+def align_by_hour_of_week(source: pd.DatetimeIndex, target) -> np.ndarray:
+    """
+    Как align_by_day_of_year, но несовпавшие метки сдвигаются к ближайшему
+    тому же дню недели. source должен идти с постоянным шагом.
+    """
+    target = pd.DatetimeIndex(target)
+    positions = align_by_day_of_year(source, target)
+    shift = (positions >= 0) & (source.get_indexer(target) < 0)
+    if shift.any():
+        steps_per_day = int(pd.Timedelta(days=1) / (source[1] - source[0]))
+        src_dow = source.dayofweek.to_numpy()[positions[shift]]
+        delta = (target.dayofweek.to_numpy()[shift] - src_dow + 3) % 7 - 3
+        moved = positions[shift] + delta * steps_per_day
+        week = 7 * steps_per_day
+        moved = np.where(moved < 0, moved + week, moved)
+        moved = np.where(moved >= len(source), moved - week, moved)
+        positions[shift] = moved
+    return positions
@@ -1,7 +1,9 @@
 import os
-import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 import calendar
+import results
+from aggregators import PeakAnalytics
 
 # Улучшенный анализ энергопотребления и параметров модели
 # Отрисовка паттернов:
@@ -108,15 +110,80 @@ def analyze_patterns(ts, name, output_dir, agg_func='mean'):
     )
 
 
-def main():
-    agent_path = os.path.join('output', 'agent_data.csv')
-    model_path = os.path.join('output', 'model_data.csv')
+def peak_analytics(root=results.RESULTS_DIR, top_n=10, bin_width=1000.0, step_hours=None) -> dict:
+    """
+    Пиковые показатели (aggregators.PeakAnalytics) по хранилищу результатов
+    за один проход по партициям: суммы по типам для каждого шага и пики
+    отдельных зданий (для коэффициентов совмещения внутри типов) считаются
+    по колонкам партиции, без сортировки. Номер шага строки —
+    (datetime - start партиции) // шаг, шаг — freq из индекса хранилища
+    (для хранилищ без freq — минимальный интервал меток первого здания:
+    его строки в партиции упорядочены по времени).
+    step_hours — длительность шага в часах; по умолчанию — по этому шагу.
+    """
+    index = results.read_index(root)
+    type_names = sorted(set(index['agents'].values()))
+    type_code = {a: type_names.index(t) for a, t in index['agents'].items()}
+    n_types = len(type_names)
+    peaks = PeakAnalytics(top_n=top_n, bin_width=bin_width)
+    agent_peak = {}
+    delta = results.step_delta(index)
+
+    for part in index['partitions']:
+        path = os.path.join(root, part['name'])
+        dt = np.load(os.path.join(path, 'datetime.npy'), mmap_mode='r')
+        cons = np.load(os.path.join(path, 'consumption.npy'), mmap_mode='r')
+        agents = list(part['agent_rows'])
+        starts = np.array([part['agent_rows'][a][0] for a in agents])
+        lengths = np.array([e - s for s, e in part['agent_rows'].values()])
+        codes = np.repeat([type_code[a] for a in agents], lengths)
+
+        if delta is None:
+            s, e = part['agent_rows'][agents[0]]
+            gaps = np.diff(dt[s:e])
+            delta = gaps.min() if len(gaps) else np.timedelta64(1, 'h').astype('m8[ns]')
+        if step_hours is None:
+            step_hours = delta / np.timedelta64(1, 'h')
+        start = np.datetime64(part['start'], 'ns')
+        step = ((dt - start) // delta).astype(np.int64)
+        n_steps = int(step.max()) + 1 if len(step) else 0
+        sums = np.bincount(step * n_types + codes, weights=cons,
+                           minlength=n_steps * n_types).reshape(n_steps, n_types)
+        present = np.bincount(step, minlength=n_steps) > 0
+        for k in np.flatnonzero(present):
+            peaks.update(start + k * delta, {(t, None): v for t, v in zip(type_names, sums[k])},
+                         step_hours)
+
+        for a, value in zip(agents, np.maximum.reduceat(np.asarray(cons), starts)):
+            agent_peak[a] = max(agent_peak.get(a, value), value)
+
+    for agent, value in agent_peak.items():
+        t = index['agents'][agent]
+        peaks.unit_peaks[t] = peaks.unit_peaks.get(t, 0.0) + value / step_hours
+    return peaks.result()
 
-    df_agent = pd.read_csv(agent_path, parse_dates=['datetime']).set_index('datetime')
-    df_model = pd.read_csv(model_path, parse_dates=['datetime']).set_index('datetime')
+
+def main():
+    # Данные читаются из индексированного хранилища (output/results):
+    # по одному типу за раз, полная таблица агентов в память не загружается
+    df_model = results.load_model_vars()
+    agent_types = sorted(set(results.agent_types().values()))
+
+    # По типам агентов; общий расход — сумма почасовых итогов типов
+    total = None
+    for agent_type in agent_types:
+        ts = results.load(types=[agent_type]).set_index('datetime')['consumption']
+        safe = agent_type.lower()
+        analyze_patterns(
+            ts,
+            name=f'{safe}_consumption',
+            output_dir=os.path.join('analysis', safe + '_consumption'),
+            agg_func='sum'
+        )
+        by_step = ts.groupby(level=0).sum()
+        total = by_step if total is None else total.add(by_step, fill_value=0.0)
 
     # Общий расход энергии
-    total = df_agent['consumption']
     analyze_patterns(
         total,
         name='total_consumption',
@@ -124,16 +191,11 @@ def main():
         agg_func='sum'
     )
 
-    # По типам агентов
-    for agent_type, group in df_agent.groupby('AgentType'):
-        ts = group['consumption']
-        safe = agent_type.lower()
-        analyze_patterns(
-            ts,
-            name=f'{safe}_consumption',
-            output_dir=os.path.join('analysis', safe + '_consumption'),
-            agg_func='sum'
-        )
+    # Пики, часы наибольшей нагрузки, совмещение максимумов, продолжительность нагрузки
+    peaks_dir = os.path.join('analysis', 'peaks')
+    ensure_dir(peaks_dir)
+    for name, table in peak_analytics().items():
+        table.to_csv(os.path.join(peaks_dir, f'{name}.csv'))
 
     # Параметры модели
     for col in ['office_population', 'hospitalized', 'patients_total']:
@@ -0,0 +1,283 @@
+"""
+Распределённый прогон сценариев EnergyConsumptionModel через очередь задач.
+
+Протокол: сценарий (JSON-спецификация) ставится в очередь, воркер на любом
+узле забирает его, прогоняет модель и кладёт артефакт (CSV потребления по
+типам зданий) в общий каталог; в очереди остаётся ссылка на артефакт.
+В конце артефакты сливаются в одну таблицу.
+
+Роль брокера играет SQLite-файл на общем диске — этого достаточно для
+нескольких узлов и позволяет всё проверить на одной машине.
+
+Спецификация сценария:
+    {"scenario_id": "base", "steps": 8760,
+     "model": {"n_offices": 3, "start_datetime": "2021-01-01 00:00", "freq": "1h"}}
+
+    python distributed.py submit scenarios.json
+    python distributed.py worker            # на каждом узле, сколько угодно раз
+    python distributed.py stats
+    python distributed.py merge
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import numpy as np
+import pandas as pd
+
+QUEUE_PATH    = os.path.join('output', 'queue.sqlite')
+ARTIFACT_DIR  = os.path.join('output', 'artifacts')
+# Колонки артефакта задачи (и слитой таблицы)
+ARTIFACT_COLUMNS = ['scenario_id', 'Step', 'datetime', 'AgentType', 'consumption']
+
+# Ключи model-спецификации с количеством зданий каждого типа → тип реестра
+COUNT_KEYS = {'n_enterprises': 'enterprise', 'n_offices': 'office', 'n_hospitals': 'hospital',
+              'n_malls': 'mall', 'n_modern_residential': 'modern_residential',
+              'n_residential': 'residential'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id          TEXT PRIMARY KEY,
+    spec        TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'pending',   -- pending / running / done / failed
+    worker      TEXT,
+    artifact    TEXT,
+    error       TEXT,
+    steps       INTEGER,
+    claimed_at  REAL,
+    finished_at REAL,
+    elapsed     REAL
+)
+"""
+
+
+def connect(db_path: str = QUEUE_PATH) -> sqlite3.Connection:
+    """Открывает очередь (создаёт при необходимости)."""
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def submit(specs: list[dict], db_path: str = QUEUE_PATH) -> list[str]:
+    """Ставит сценарии в очередь; повторная постановка того же id игнорируется."""
+    conn = connect(db_path)
+    ids = []
+    with conn:
+        for i, spec in enumerate(specs):
+            task_id = str(spec.get('scenario_id', f'scenario_{i}'))
+            conn.execute('INSERT OR IGNORE INTO tasks (id, spec, steps) VALUES (?, ?, ?)',
+                         (task_id, json.dumps(spec), int(spec['steps'])))
+            ids.append(task_id)
+    conn.close()
+    return ids
+
+
+def split_by_type(spec: dict) -> list[dict]:
+    """
+    Делит сценарий на независимые подзадачи — по одному типу зданий в каждой.
+    Итоги по типам не зависят друг от друга, поэтому merge их просто склеивает.
+    Случайные параметры зданий выводятся из seed модели по типу и номеру
+    здания (seeding.py), поэтому подзадачи дают те же значения, что и общий прогон.
+
+    Подзадача получает только свою часть состава: строки таблицы population
+    (путь к CSV/.npz или словарь колонок) с её типом, иначе — конфигурацию
+    buildings (или n_*) этого типа после registry.normalize_config.
+    Сценарий, состав которого так не разделить, — ValueError.
+    """
+    import registry
+    from population import read_population
+
+    model = dict(spec.get('model', {}))
+    base = {k: v for k, v in model.items()
+            if k not in COUNT_KEYS and k not in ('buildings', 'population')}
+    if model.get('population') is not None:
+        population = model['population']
+        if isinstance(population, str):
+            population = read_population(population)
+        elif isinstance(population, dict):
+            population = pd.DataFrame(population)
+        else:
+            raise ValueError("Разбить можно только population в виде пути к таблице "
+                             f"или словаря колонок, получено {type(population).__name__}")
+        if 'type' not in population.columns:
+            raise ValueError("В таблице зданий нет колонки type — сценарий не разбить по типам")
+        types = population['type'].astype(str)
+        for name in types.unique():
+            registry.get(name)
+        shards = {name: {'population': population[types == name].to_dict('list')}
+                  for name in registry.REGISTRY if (types == name).any()}
+    else:
+        buildings = model.get('buildings')
+        if buildings is None:
+            buildings = {name: model.get(key, 1) for key, name in COUNT_KEYS.items()}
+        shards = {name: {'buildings': {name: {'count': count, **params}}}
+                  for name, (count, params) in registry.normalize_config(buildings).items()
+                  if count}
+
+    return [{**spec, 'scenario_id': f"{spec['scenario_id']}/{name}",
+             'parent_id': spec['scenario_id'], 'model': {**base, **part}}
+            for name, part in shards.items()]
+
+
+def claim(conn: sqlite3.Connection, worker: str):
+    """Атомарно забирает одну задачу из очереди; None, если задач нет."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute(
+            "SELECT id, spec FROM tasks WHERE status = 'pending' ORDER BY rowid LIMIT 1"
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE tasks SET status = 'running', worker = ?, claimed_at = ? WHERE id = ?",
+                (worker, time.time(), row[0])
+            )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return None if row is None else (row[0], json.loads(row[1]))
+
+
+def requeue_stale(timeout: float, db_path: str = QUEUE_PATH) -> int:
+    """Возвращает в очередь задачи, зависшие в running дольше timeout секунд (упавший узел)."""
+    conn = connect(db_path)
+    with conn:
+        cur = conn.execute(
+            "UPDATE tasks SET status = 'pending', worker = NULL "
+            "WHERE status = 'running' AND claimed_at < ?",
+            (time.time() - timeout,)
+        )
+    conn.close()
+    return cur.rowcount
+
+
+def run_scenario(spec: dict) -> pd.DataFrame:
+    """Прогоняет модель по спецификации; итог — потребление по типам на каждом шаге."""
+    from model import EnergyConsumptionModel
+
+    kwargs = dict(spec.get('model', {}))
+    if 'start_datetime' in kwargs:
+        kwargs['start_datetime'] = pd.Timestamp(kwargs['start_datetime'])
+    if isinstance(kwargs.get('population'), dict):
+        # часть таблицы зданий из split_by_type — словарь колонок
+        kwargs['population'] = pd.DataFrame(kwargs['population'])
+    steps = int(spec['steps'])
+    model = EnergyConsumptionModel(**kwargs, collect='post', horizon_steps=steps)
+    for _ in range(steps):
+        model.step()
+
+    by_type = model.results.by_type()
+    totals = by_type.reset_index().melt(id_vars='datetime', var_name='AgentType',
+                                        value_name='consumption')
+    totals['Step'] = np.tile(np.arange(len(by_type)), by_type.shape[1])
+    totals = totals.sort_values(['Step', 'AgentType'], ignore_index=True)
+    return totals[['Step', 'datetime', 'AgentType', 'consumption']]
+
+
+def _artifact_path(artifact_dir: str, task_id: str) -> str:
+    return os.path.join(artifact_dir, task_id.replace('/', '__') + '.csv')
+
+
+def worker(db_path: str = QUEUE_PATH, artifact_dir: str = ARTIFACT_DIR,
+           worker_id: str | None = None, poll: float = 1.0, wait: bool = False) -> int:
+    """
+    Цикл воркера: забирает задачи, пишет артефакты в общий каталог.
+    Без wait завершается, когда очередь пуста. Возвращает число выполненных задач.
+    """
+    worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+    os.makedirs(artifact_dir, exist_ok=True)
+    conn = connect(db_path)
+    done = 0
+    while True:
+        task = claim(conn, worker_id)
+        if task is None:
+            if not wait:
+                break
+            time.sleep(poll)
+            continue
+
+        task_id, spec = task
+        started = time.time()
+        try:
+            result = run_scenario(spec)
+            result.insert(0, 'scenario_id', spec.get('parent_id', task_id))
+            path = _artifact_path(artifact_dir, task_id)
+            result.to_csv(path, index=False)
+            status, artifact, error = 'done', path, None
+            done += 1
+        except Exception as exc:
+            status, artifact, error = 'failed', None, repr(exc)
+        with conn:
+            conn.execute(
+                "UPDATE tasks SET status = ?, artifact = ?, error = ?, finished_at = ?, elapsed = ? "
+                "WHERE id = ?",
+                (status, artifact, error, time.time(), time.time() - started, task_id)
+            )
+        print(f"[{worker_id}] {task_id}: {status} ({time.time() - started:.1f} s)")
+    conn.close()
+    return done
+
+
+def worker_stats(db_path: str = QUEUE_PATH) -> pd.DataFrame:
+    """Пропускная способность по воркерам: задачи, шаги, время, шагов в секунду."""
+    conn = connect(db_path)
+    df = pd.read_sql_query(
+        "SELECT worker, COUNT(*) AS scenarios, SUM(steps) AS steps, SUM(elapsed) AS busy_s "
+        "FROM tasks WHERE status = 'done' GROUP BY worker", conn
+    )
+    conn.close()
+    # задачи, выполненные быстрее разрешения таймера, дают busy_s = 0 — скорость неизвестна
+    busy = df['busy_s'].replace(0, np.nan)
+    df['steps_per_s'] = df['steps'] / busy
+    df['scenarios_per_h'] = df['scenarios'] / busy * 3600
+    return df
+
+
+def merge(db_path: str = QUEUE_PATH, out_path: str = os.path.join('output', 'scenarios.csv')) -> pd.DataFrame:
+    """Сливает артефакты выполненных задач в одну таблицу (пустую, если таких нет)."""
+    conn = connect(db_path)
+    paths = [r[0] for r in conn.execute(
+        "SELECT artifact FROM tasks WHERE status = 'done' ORDER BY rowid"
+    )]
+    pending = conn.execute("SELECT COUNT(*) FROM tasks WHERE status != 'done'").fetchone()[0]
+    conn.close()
+    if pending:
+        print(f"Внимание: {pending} задач ещё не выполнено")
+    if paths:
+        merged = pd.concat([pd.read_csv(p) for p in paths], ignore_index=True)
+    else:
+        merged = pd.DataFrame(columns=ARTIFACT_COLUMNS)
+    merged.to_csv(out_path, index=False)
+    return merged
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Очередь сценариев EnergyConsumptionModel")
+    parser.add_argument('command', choices=['submit', 'worker', 'stats', 'merge', 'requeue'])
+    parser.add_argument('specs', nargs='?', help="JSON-файл со списком сценариев (для submit)")
+    parser.add_argument('--db', default=QUEUE_PATH)
+    parser.add_argument('--artifacts', default=ARTIFACT_DIR)
+    parser.add_argument('--split', action='store_true', help="разбить сценарии по типам зданий")
+    parser.add_argument('--wait', action='store_true', help="воркер ждёт новые задачи")
+    parser.add_argument('--timeout', type=float, default=3600, help="для requeue, секунд")
+    args = parser.parse_args()
+
+    if args.command == 'submit':
+        with open(args.specs, encoding='utf-8') as f:
+            specs = json.load(f)
+        if args.split:
+            specs = [part for spec in specs for part in split_by_type(spec)]
+        print(f"Submitted {len(submit(specs, args.db))} tasks")
+    elif args.command == 'worker':
+        worker(args.db, args.artifacts, wait=args.wait)
+    elif args.command == 'stats':
+        print(worker_stats(args.db).to_string(index=False))
+    elif args.command == 'requeue':
+        print(f"Requeued {requeue_stale(args.timeout, args.db)} tasks")
+    else:
+        merged = merge(args.db)
+        print(f"Merged {len(merged):,} rows")
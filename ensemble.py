@@ -0,0 +1,148 @@
+"""
+Монте-Карло режим: K реплик модели за один проход.
+
+Реплики — дополнительная (первая) ось массивов, а не K отдельных симуляций
+Mesa. Здания реплик — здания переданной модели (площади офисов — agent.area),
+каждая реплика получает свои возмущённые входы: T_out, office_population,
+hospitalized, presence, шум трафика ТРЦ и остатки регрессии предприятия.
+С redraw_office_areas площади офисов в каждой реплике вытягиваются заново
+из потоков seeding.agent_rng. На выходе — перцентильные полосы потребления
+по типам зданий.
+
+    python ensemble.py
+"""
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+import kernels
+from seeding import agent_rng, spawn_seeds
+from model import EnergyConsumptionModel
+from EnterpriseBuilding.agent import EnterpriseBuildingAgent
+from OfficeBuilding.agent import OfficeBuildingAgent
+from HospitalBuilding.agent import HospitalBuildingAgent
+from MallBuilding.agent import MallAgent
+from ModernResidentialBuilding.agent import ModernResidentialBuildingAgent
+from ResidentialBuilding.agent import ResidentialBuildingAgent
+
+# Масштабы возмущений по умолчанию
+DEFAULT_NOISE = {
+    'T_out':             1.0,   # °C, независимо на каждом шаге
+    'office_population': 0.10,  # относительная ошибка, общая для реплики
+    'hospitalized':      0.10,  # относительная ошибка, общая для реплики
+    'presence':          0.05,  # абсолютная ошибка, общая для реплики
+    'mall_occupancy':    10.0,  # п.п. на каждом шаге, как NOISE_STD в make_synthetic_trafic.py
+    'enterprise_kwh':    6.0,   # кВт·ч на каждом шаге, RMSE регрессии (model_metrics.txt)
+}
+
+
+def run_ensemble(model: EnergyConsumptionModel, steps: int, n_replicates: int = 100,
+                 seed: int = 0, noise: dict | None = None,
+                 percentiles=(5, 50, 95), redraw_office_areas: bool = False):
+    """
+    Прогоняет n_replicates реплик модели на steps шагов от model.current_datetime.
+    Площади офисов — площади зданий модели; при redraw_office_areas у реплики k
+    площадь офиса i — из потока agent_rng(seed реплики k, 'office', i), где seed
+    реплик порождаются из seed (SeedSequence.spawn).
+
+    Возвращает (bands, replicates):
+      - bands — DataFrame [datetime, AgentType, p5, p50, p95, ...] с полосами
+        суммарного потребления по типам и по всем зданиям ('total');
+      - replicates — {AgentType: массив (K, T)} суммарного потребления типа.
+    """
+    if model.step_hours != 1:
+        raise ValueError("Ансамбль считается на часовом шаге (freq='1h')")
+    noise = {**DEFAULT_NOISE, **(noise or {})}
+    rng = np.random.default_rng(seed)
+    K = n_replicates
+
+    env = model.environment_arrays(steps)
+    hour, dow, day, month = env['hour'], env['dow'], env['day'], env['month']
+
+    # Возмущённые входы: форма (K, T)
+    T_out = env['T_out'] + rng.normal(0.0, noise['T_out'], (K, steps))
+    office_population = np.maximum(
+        env['office_population'] * (1 + rng.normal(0.0, noise['office_population'], (K, 1))), 0
+    )
+    hospitalized = np.maximum(
+        env['hospitalized'] * (1 + rng.normal(0.0, noise['hospitalized'], (K, 1))), 0
+    )
+    presence = env['presence'] + rng.normal(0.0, noise['presence'], (K, 1))
+
+    replicates = {}
+    for agent_cls, agents in model.agents_by_type.items():
+        agents = list(agents)
+        n = len(agents)
+
+        if agent_cls is OfficeBuildingAgent:
+            # Формула линейна по площади: сумма по офисам = формула от суммы площадей
+            if redraw_office_areas:
+                replicate_seeds = spawn_seeds(seed, K)
+                areas = np.array([[agent_rng(s, 'office', i).choice(agent_cls.AREA_CHOICES,
+                                                                     p=agent_cls.AREA_PROBS)
+                                   for i in range(n)] for s in replicate_seeds], dtype=float)
+            else:
+                areas = np.broadcast_to([a.area for a in agents], (K, n))
+            ppl = office_population / model.num_office_agents
+            total = kernels.office_consumption(
+                areas.sum(axis=1, keepdims=True), hour, month, day, ppl * n
+            )
+
+        elif agent_cls is HospitalBuildingAgent:
+            total = n * kernels.hospital_consumption(hospitalized, env['patients'], month, day)
+
+        elif agent_cls is MallAgent:
+            occ = kernels.mall_occupancy(agents[0].occ_clf, T_out, env['day_off'], hour, dow, month)
+            occ = np.clip(occ + rng.normal(0.0, noise['mall_occupancy'], occ.shape), 0, 100) / 100
+            total = sum(
+                kernels.mall_consumption(
+                    occ, hour, T_out, month, day,
+                    floor_area=a.floor_area, escalator_count=a.escalator_count,
+                    opening_hour=a.opening_hour, closing_hour=a.closing_hour,
+                )
+                for a in agents
+            )
+
+        elif agent_cls is EnterpriseBuildingAgent:
+            usage = kernels.enterprise_usage(agents[0], env['datetime'], env['is_weekend'])
+            # сумма n независимых остатков ~ N(0, σ·√n)
+            resid = rng.normal(0.0, noise['enterprise_kwh'] * np.sqrt(n), (K, steps))
+            total = (n * usage + resid) * 1000.0
+
+        elif agent_cls is ResidentialBuildingAgent:
+            total = n * kernels.residential_consumption(presence, month, day)
+
+        elif agent_cls is ModernResidentialBuildingAgent:
+            total = n * kernels.modern_residential_consumption(presence, month, day)
+
+        else:
+            raise ValueError(f"Нет векторной формулы для {agent_cls.__name__}")
+
+        replicates[agent_cls.__name__] = np.broadcast_to(total, (K, steps))
+
+    replicates['total'] = sum(replicates.values())
+    return percentile_bands(replicates, env['datetime'], percentiles), replicates
+
+
+def percentile_bands(replicates: dict, index, percentiles=(5, 50, 95)) -> pd.DataFrame:
+    """Сводит реплики {AgentType: (K, T)} в длинную таблицу перцентилей."""
+    frames = []
+    for agent_type, values in replicates.items():
+        bands = np.percentile(values, percentiles, axis=0)
+        df = pd.DataFrame({f'p{q:g}': band for q, band in zip(percentiles, bands)})
+        df.insert(0, 'AgentType', agent_type)
+        df.insert(0, 'datetime', index)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == '__main__':
+    model = EnergyConsumptionModel(
+        start_datetime=datetime(2021, 1, 1, 0, 0),
+        weather_path=os.path.join('data', 'environment_data.npz')
+    )
+    bands, _ = run_ensemble(model, steps=24 * 365, n_replicates=100)
+    os.makedirs('output', exist_ok=True)
+    bands.to_csv(os.path.join('output', 'ensemble_bands.csv'), index=False)
+    print('Bands saved to output/ensemble_bands.csv')
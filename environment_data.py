@@ -1,46 +1,201 @@
-from datetime import datetime
+"""
+Сборка почасовых данных окружения (T_out, календарные признаки, day_off)
+для произвольного диапазона лет и координат.
+
+Погода Meteostat кэшируется по годам в data/cache, поэтому повторная сборка
+мгновенна и работает без сети (offline=True). Результат сохраняется в CSV
+или в колоночный бинарный .npz, который модель читает напрямую через
+load_environment.
+
+    python environment_data.py --start-year 2021 --end-year 2023
+"""
+import os
+import argparse
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 import holidays
-from meteostat import Stations, Hourly
-import os
 
-# 1. Интервал: с 2024-01-01 00:00 до 2024-12-31 23:00
-start = datetime(2021, 1, 1, 0)
-end   = datetime(2021, 12, 31, 23)
+BASE_DIR  = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR  = os.path.join(BASE_DIR, 'data')
+CACHE_DIR = os.path.join(DATA_DIR, 'cache')
+
+# Координаты Воронежа (по умолчанию)
+LAT, LON = 51.6755, 39.2103
+
+COLUMNS = ['datetime', 'hour', 'day_of_week', 'month', 'day_off', 'T_out']
+
+# Непрерывные величины: при смене шага интерполируются или усредняются
+CONTINUOUS_COLUMNS = ['T_out', 'office_population', 'hospitalized', 'patients_total',
+                      'presence_in_building']
+
+
+def _weather_cache_path(year: int, lat: float, lon: float, cache_dir: str) -> str:
+    return os.path.join(cache_dir, f'weather_{lat:.4f}_{lon:.4f}_{year}.csv')
+
+
+def fetch_weather_year(year: int, lat: float = LAT, lon: float = LON,
+                       cache_dir: str = CACHE_DIR, offline: bool = False) -> pd.DataFrame:
+    """
+    Почасовая T_out за год с ближайшей к (lat, lon) станции Meteostat.
+    Сначала читается кэш; в offline-режиме его отсутствие — ошибка.
+    """
+    path = _weather_cache_path(year, lat, lon, cache_dir)
+    if os.path.isfile(path):
+        return pd.read_csv(path, parse_dates=['datetime'])
+    if offline:
+        raise RuntimeError(f"Offline: нет кэша погоды {path}")
+
+    from meteostat import Stations, Hourly
+
+    # Ближайшая станция и почасовые данные за год
+    station_id = Stations().nearby(lat, lon).fetch(1).index[0]
+    start, end = pd.Timestamp(year, 1, 1, 0), pd.Timestamp(year, 12, 31, 23)
+    df = Hourly(station_id, start.to_pydatetime(), end.to_pydatetime()).fetch()
+    df = (
+        df[['temp']].rename(columns={'temp': 'T_out'})
+          .reset_index().rename(columns={'time': 'datetime'})
+    )
+
+    os.makedirs(cache_dir, exist_ok=True)
+    df.to_csv(path, index=False)
+    return df
+
+
+def add_calendar_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Добавляет hour, day_of_week, month и day_off (суббота/воскресенье
+    или праздник РФ) — всё векторно по колонке datetime.
+    """
+    dt = df['datetime'].dt
+    df['hour']        = dt.hour
+    df['day_of_week'] = dt.dayofweek
+    df['month']       = dt.month
+
+    df['day_off'] = day_off_flags(pd.DatetimeIndex(df['datetime']))
+    return df
+
+
+def day_off_flags(index: pd.DatetimeIndex) -> np.ndarray:
+    """Выходной: суббота/воскресенье или праздник РФ — для любых лет."""
+    years = sorted(set(index.year.tolist()))
+    ru_holidays = pd.to_datetime(list(holidays.Russia(years=years).keys()))
+    return np.asarray((index.dayofweek >= 5) | index.normalize().isin(ru_holidays))
+
+
+def build_environment(start_year: int, end_year: int | None = None,
+                      lat: float = LAT, lon: float = LON,
+                      cache_dir: str = CACHE_DIR, offline: bool = False) -> pd.DataFrame:
+    """Собирает данные окружения за годы [start_year, end_year] включительно."""
+    end_year = start_year if end_year is None else end_year
+    frames = [
+        fetch_weather_year(year, lat, lon, cache_dir, offline)
+        for year in range(start_year, end_year + 1)
+    ]
+    df = pd.concat(frames, ignore_index=True).sort_values('datetime')
+    df = add_calendar_features(df.reset_index(drop=True))
+    return df[COLUMNS]
+
+
+def save_environment(df: pd.DataFrame, path: str) -> None:
+    """
+    Сохраняет данные окружения. Расширение .npz — колоночный бинарный
+    формат (по массиву на колонку), иначе CSV.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if path.endswith('.npz'):
+        columns = {}
+        for col in df.columns:
+            values = df[col].to_numpy()
+            # строковые колонки храним как unicode-массивы, без pickle
+            columns[col] = values.astype(str) if values.dtype == object else values
+        np.savez(path, **columns)
+    else:
+        df.to_csv(path, index=False)
+
+
+def load_environment(path: str) -> pd.DataFrame:
+    """
+    Загружает данные окружения (.npz или .csv), индекс — datetime.
+    Прочитанный файл кэшируется в процессе (до изменения файла), вызывающий
+    получает копию и может её менять.
+    """
+    return _read_environment(os.path.abspath(path), os.path.getmtime(path)).copy()
+
+
+@lru_cache(maxsize=8)
+def _read_environment(path: str, mtime: float) -> pd.DataFrame:
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            df = pd.DataFrame({col: data[col] for col in data.files})
+    else:
+        df = pd.read_csv(path, parse_dates=['datetime'])
+    return df.set_index('datetime')
+
 
-# 2. Координаты Воронежа
-lat, lon = 51.6755, 39.2103
+def resample_environment(df: pd.DataFrame, freq) -> pd.DataFrame:
+    """
+    Приводит почасовые данные окружения (индекс datetime) к шагу freq.
 
-# 3. Находим ближайшую станцию к Воронежу
-stations   = Stations()
-station_df = stations.nearby(lat, lon).fetch(1)
-station_id = station_df.index[0]
+    Мельче часа — непрерывные колонки интерполируются по времени, остальные
+    протягиваются вперёд; крупнее часа — непрерывные усредняются, остальные
+    берутся на начало интервала. Календарные колонки пересчитываются по индексу.
+    """
+    step = pd.Timedelta(freq)
+    hour = pd.Timedelta(hours=1)
+    if step == hour:
+        return df
 
-# 4. Загружаем почасовые данные
-data = Hourly(station_id, start, end)
-df   = data.fetch()
+    continuous = [c for c in CONTINUOUS_COLUMNS if c in df.columns]
+    other = [c for c in df.columns if c not in continuous]
+    if step < hour:
+        index = pd.date_range(df.index.min(), df.index.max() + hour - step, freq=step)
+        out = df[continuous].reindex(index).interpolate(method='time').ffill()
+        out = out.join(df[other].reindex(index, method='ffill'))[df.columns]
+    else:
+        agg = {**{c: 'mean' for c in continuous}, **{c: 'first' for c in other}}
+        out = df.resample(step).agg(agg)[df.columns]
 
-# 5. Оставляем и переименовываем колонку температуры
-df = df[['temp']].rename(columns={'temp': 'T_out'})
+    out.index.name = 'datetime'
+    for col, values in (('hour', out.index.hour), ('day_of_week', out.index.dayofweek),
+                        ('month', out.index.month)):
+        if col in out.columns:
+            out[col] = values
+    return out
 
-# 6. Сбрасываем индекс, делаем datetime-столбец
-df = df.reset_index().rename(columns={'time': 'datetime'})
 
-# 7. Добавляем новые признаки из datetime
-df['hour']         = df['datetime'].dt.hour
-df['day_of_week']  = df['datetime'].dt.dayofweek
-df['month']        = df['datetime'].dt.month
+def seed_cache_from_csv(path: str, lat: float = LAT, lon: float = LON,
+                        cache_dir: str = CACHE_DIR) -> None:
+    """Заполняет погодный кэш по годам из ранее собранного файла окружения."""
+    df = pd.read_csv(path, parse_dates=['datetime'])
+    os.makedirs(cache_dir, exist_ok=True)
+    for year, part in df.groupby(df['datetime'].dt.year):
+        part[['datetime', 'T_out']].to_csv(
+            _weather_cache_path(year, lat, lon, cache_dir), index=False
+        )
 
-# 8. Признак выходного дня (суббота/воскресенье или праздник РФ)
-ru_holidays = holidays.Russia(years=2021)
-df['day_off'] = df['datetime'].apply(
-    lambda x: (x.weekday() >= 5) or (x.date() in ru_holidays)
-)
 
-# 9. Оставляем только нужные столбцы и сохраняем
-df = df[['datetime', 'hour', 'day_of_week', 'month', 'day_off', 'T_out']]
-base = os.path.dirname(__file__)
-data_path = os.path.join(base, 'data', 'environment_data.csv')
-df.to_csv(data_path, index=False)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Сборка данных окружения")
+    parser.add_argument('--start-year', type=int, default=2021)
+    parser.add_argument('--end-year', type=int, default=None)
+    parser.add_argument('--lat', type=float, default=LAT)
+    parser.add_argument('--lon', type=float, default=LON)
+    parser.add_argument('--offline', action='store_true',
+                        help="не обращаться к сети, использовать только кэш")
+    parser.add_argument('--seed-cache', metavar='CSV',
+                        help="заполнить кэш из готового файла окружения и выйти")
+    parser.add_argument('--out', nargs='+', default=[
+        os.path.join(DATA_DIR, 'environment_data.csv'),
+        os.path.join(DATA_DIR, 'environment_data.npz'),
+    ])
+    args = parser.parse_args()
 
-print("Файл voronezh_2024_weather.csv создан.")  
+    if args.seed_cache:
+        seed_cache_from_csv(args.seed_cache, args.lat, args.lon)
+    else:
+        df = build_environment(args.start_year, args.end_year, args.lat, args.lon,
+                               offline=args.offline)
+        for out in args.out:
+            save_environment(df, out)
+            print(f"Файл {out} создан ({len(df):,} строк).")
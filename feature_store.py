@@ -0,0 +1,144 @@
+"""
+Кэш признаков для обучения моделей и их дообучение на новых данных.
+
+Почасовая матрица признаков (вместе с целевой колонкой) строится из
+исходного CSV один раз и хранится в .npz по колонкам рядом с метаданными:
+хэш исходного файла, его размер и хэш этого префикса. Дальше:
+  - файл не изменился — признаки читаются из .npz без разбора CSV;
+  - к файлу дописаны строки (новые показания счётчиков) — разбирается и
+    обрабатывается только дописанный хвост, новые часы добавляются к кэшу;
+  - файл изменён иначе — признаки строятся заново.
+
+featurize(raw) → DataFrame по datetime должна обрабатывать строки или
+часы независимо друг от друга. Хвост добавляется, только если все его
+строки попали в часы позже кэшированных и набор колонок совпал (dummy-
+признаки по тем же категориям); иначе признаки строятся заново.
+
+    df = feature_store.load_features('mall', path, featurize)
+    model = feature_store.extend_model(model, X, y, n_new=len(X) - model.trained_rows_)
+"""
+import io
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+
+FEATURE_DIR = os.path.join('data', 'cache', 'features')
+
+
+def _digest(path: str, n_bytes: int | None = None) -> str:
+    """sha256 первых n_bytes байт файла (всего файла при None)."""
+    h = hashlib.sha256()
+    left = os.path.getsize(path) if n_bytes is None else n_bytes
+    with open(path, 'rb') as f:
+        while left > 0:
+            chunk = f.read(min(1 << 20, left))
+            if not chunk:
+                break
+            h.update(chunk)
+            left -= len(chunk)
+    return h.hexdigest()
+
+
+def _paths(name: str, cache_dir: str):
+    base = os.path.join(cache_dir, name)
+    return base + '.npz', base + '.json'
+
+
+def _save(df: pd.DataFrame, meta: dict, name: str, cache_dir: str):
+    data_path, meta_path = _paths(name, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    columns = list(df.columns)
+    np.savez(data_path, __index__=df.index.to_numpy('datetime64[ns]'),
+             **{f'c{i}': df[c].to_numpy() for i, c in enumerate(columns)})
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({**meta, 'columns': columns}, f)
+
+
+def _load(name: str, cache_dir: str):
+    data_path, meta_path = _paths(name, cache_dir)
+    if not (os.path.isfile(data_path) and os.path.isfile(meta_path)):
+        return None, None
+    with open(meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+    with np.load(data_path) as data:
+        df = pd.DataFrame({c: data[f'c{i}'] for i, c in enumerate(meta['columns'])},
+                          index=pd.DatetimeIndex(data['__index__'], name='datetime'))
+    return df, meta
+
+
+def load_features(name: str, path: str, featurize, read=pd.read_csv, version: int = 1,
+                  cache_dir: str = FEATURE_DIR) -> pd.DataFrame:
+    """
+    Признаки файла path: из кэша, с дообработкой дописанного хвоста или
+    заново. read(файл) → сырые строки, featurize(сырые строки) → признаки.
+    version меняют при изменении featurize — кэш прежней версии не используется.
+    """
+    size = os.path.getsize(path)
+    cached, meta = _load(name, cache_dir)
+    if cached is not None and meta.get('version') == version:
+        if meta['size'] == size and meta['sha256'] == _digest(path):
+            return cached
+        if meta['size'] < size and meta['prefix_sha256'] == _digest(path, meta['size']):
+            extended = _append_tail(cached, meta, path, featurize, read)
+            if extended is not None:
+                _save(extended, _meta(path, size, version), name, cache_dir)
+                return extended
+
+    df = featurize(read(path))
+    _save(df, _meta(path, size, version), name, cache_dir)
+    return df
+
+
+def _meta(path: str, size: int, version: int) -> dict:
+    digest = _digest(path)
+    with open(path, 'rb') as f:
+        header = f.readline().decode('utf-8')
+    return {'version': version, 'size': size, 'sha256': digest,
+            'prefix_sha256': digest, 'header': header}
+
+
+def _append_tail(cached, meta, path, featurize, read):
+    """Кэш + признаки дописанных строк; None, если хвост нельзя обработать отдельно."""
+    with open(path, 'rb') as f:
+        f.seek(meta['size'] - 1)
+        if f.read(1) != b'\n':      # дописано внутрь последней строки
+            return None
+        tail = f.read().decode('utf-8')
+    new = featurize(read(io.StringIO(meta['header'] + tail)))
+    # строки хвоста попали в часы, уже посчитанные по префиксу (хвост начался
+    # посреди часа или строки идут не по порядку) — эти часы надо пересчитать
+    if len(new) and new.index.min() <= cached.index.max():
+        return None
+    # другой набор колонок (например, dummy-признаки по другим категориям) —
+    # признаки хвоста несопоставимы с кэшем
+    if set(new.columns) != set(cached.columns):
+        return None
+    return pd.concat([cached, new[cached.columns].astype(cached.dtypes.to_dict())])
+
+
+# ------------------------------ Дообучение ---------------------------------------------
+
+def extend_model(model, X, y, n_new: int, n_estimators: int = 20):
+    """
+    Дообучает модель после добавления n_new последних строк в X, y (X, y —
+    все данные): ансамбли деревьев получают n_estimators новых деревьев
+    (warm_start), уже построенные деревья не пересчитываются. Бустинг
+    строит новые ступени по остаткам на всех данных, лес — новые деревья
+    по новым строкам. Прочие модели обучаются заново. В trained_rows_
+    записывается число строк, на которых модель обучена.
+    """
+    if n_new <= 0:
+        return model
+    if isinstance(model, GradientBoostingRegressor):
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + n_estimators)
+        model.fit(X, y)
+    elif isinstance(model, RandomForestRegressor):
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + n_estimators)
+        model.fit(X.iloc[-n_new:], y.iloc[-n_new:])
+    else:
+        model.fit(X, y)
+    model.trained_rows_ = len(X)
+    return model
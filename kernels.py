@@ -0,0 +1,432 @@
+"""
+Векторные версии формул потребления агентов.
+
+Те же расчёты, что в step() агентов при часовом шаге, но над массивами
+NumPy: по шагам времени, зданиям и (для ансамбля) репликам. Все функции поддерживают
+broadcasting — календарные признаки формы (T,) можно комбинировать
+с входами формы (K, T). Единицы совпадают с agent.consumption.
+"""
+import numpy as np
+import pandas as pd
+
+from HospitalBuilding.agent import HospitalBuildingAgent
+from ModernResidentialBuilding.agent import ModernResidentialBuildingAgent
+from ResidentialBuilding.agent import ResidentialBuildingAgent
+
+
+def heating_season(month, day):
+    """Отопительный сезон: 15 октября – 15 апреля включительно."""
+    month, day = np.asarray(month), np.asarray(day)
+    return (((month == 10) & (day >= 15)) | (month > 10) |
+            (month < 4) | ((month == 4) & (day <= 15)))
+
+
+def presence_delta(presence, axis=-1):
+    """
+    |Δpresence| между соседними шагами вдоль оси времени.
+    На первом шаге 0 — как у агентов при _last_p is None.
+    """
+    presence = np.asarray(presence, dtype=float)
+    first = np.take(presence, [0], axis=axis)
+    return np.abs(np.diff(presence, axis=axis, prepend=first))
+
+
+# ------------------------------ Формулы по типам ---------------------------------------
+
+def office_consumption(area, hour, month, day, ppl,
+                       heating_pump_density=0.05, vent_fan_density=1.0,
+                       lighting_day_density=10.0, lighting_night_density=1.0,
+                       per_pc_load=150.0):
+    """OfficeBuildingAgent.step: мгновенная мощность, Вт."""
+    hour = np.asarray(hour)
+    heating_load = np.where(heating_season(month, day), area * heating_pump_density, 0.0)
+    night = (hour >= 22) | (hour < 7)
+    ventilation_load = area * vent_fan_density * np.where(night, 0.3, 1.0)
+    lighting_load = area * np.where(night, lighting_night_density, lighting_day_density)
+    plug_load = ppl * per_pc_load
+    return heating_load + ventilation_load + lighting_load + plug_load
+
+
+def hospital_consumption(hospitalized, patients, month, day):
+    """HospitalBuildingAgent.step: потребление за час, Вт·ч."""
+    h = HospitalBuildingAgent
+    occ = np.minimum(hospitalized, h.BEDS_TOTAL) / h.BEDS_TOTAL
+    patients = np.asarray(patients) / max(1, h.BEDS_TOTAL)
+    heat_kWh = np.where(heating_season(month, day), h._HEAT_HOURLY_NORM, 0.0)
+    base_el = h.EUI_EL_BASE * h.AREA_M2 / 8760.0
+    el_kWh = base_el * (1 + 0.56 * occ + 0.20 * patients)
+    return (heat_kWh + el_kWh) * 1000
+
+
+def mall_consumption(occ, hour, T_out, month, day, floor_area=12700,
+                     escalator_count=8, opening_hour=10, closing_hour=22):
+    """
+    MallAgent.step по уже предсказанной заполняемости occ (доля 0–1).
+    Возвращает (электричество + тепло) / 1000, как agent.consumption.
+    """
+    hour, occ, T_out = np.asarray(hour), np.asarray(occ), np.asarray(T_out)
+    is_open = (opening_hour <= hour) & (hour < closing_hour)
+    lighting_load = np.where(is_open, 18, 1) * floor_area
+    equipment_load = 15 * floor_area * np.where(occ < 0.2, 0.2, occ)
+    escalator_load = np.where(
+        is_open, np.where(occ > 0.1, 5000, 1800) * escalator_count, 0
+    )
+    cooling_load = np.where(T_out > 24, 60 * floor_area, 0)
+    ventilation_load = 4 * floor_area
+    it_load = 10.8 * floor_area
+    other_load = 50 * floor_area
+    electric = (lighting_load + equipment_load + escalator_load +
+                cooling_load + ventilation_load + it_load + other_load)
+    heat = np.where(heating_season(month, day), 11.4 * floor_area, 0)
+    return (electric + heat) / 1000.0
+
+
+def residential_consumption(presence, month, day, axis=-1):
+    """ResidentialBuildingAgent.step по ряду присутствия, Вт."""
+    r = ResidentialBuildingAgent
+    presence = np.clip(presence, 0.0, 1.0)
+    lift_kw = presence_delta(presence, axis) * r.FULL_PRESENCE_TRIPS * r.ELEV_TRIP_KWH
+    pump_kw = np.where(heating_season(month, day), r.PUMP_KW, 0.0)
+    return (r.LIGHT_KW + r.FAN_KW + r.IT_KW + pump_kw + lift_kw) * 1_000
+
+
+def modern_residential_consumption(presence, month, day, axis=-1):
+    """ModernResidentialBuildingAgent.step по ряду присутствия, Вт."""
+    r = ModernResidentialBuildingAgent
+    presence = np.clip(presence, 0.0, 1.0)
+    dprs = presence_delta(presence, axis)
+    light_kw = r.LIGHT_STBY_KW + r.LIGHT_DELTA_KW * dprs
+    lift_kw = dprs * r.FULL_PRES_TRIPS * r.ELEV_TRIP_KWH
+    pump_kw = np.where(heating_season(month, day), r.PUMP_KW, 0.0)
+    return (light_kw + r.FAN_KW + r.IT_KW + pump_kw + lift_kw) * 1_000
+
+
+# ------------------------------ ML-предикторы пачкой -----------------------------------
+
+def mall_occupancy(clf, T_out, day_off, hour, dow, month):
+    """
+    MallAgent.predict_occupancy для всех точек сразу (один вызов predict).
+    Входы приводятся к общей форме, результат — в процентах той же формы.
+    """
+    T_out, day_off, hour, dow, month = np.broadcast_arrays(T_out, day_off, hour, dow, month)
+    X = pd.DataFrame({
+        'T_out':     T_out.ravel(),
+        'day_off':   day_off.ravel().astype(int),
+        'hour_sin':  np.sin(2 * np.pi * hour.ravel() / 24),
+        'hour_cos':  np.cos(2 * np.pi * hour.ravel() / 24),
+        'dow_sin':   np.sin(2 * np.pi * dow.ravel() / 7),
+        'dow_cos':   np.cos(2 * np.pi * dow.ravel() / 7),
+        'month_sin': np.sin(2 * np.pi * (month.ravel() - 1) / 12),
+        'month_cos': np.cos(2 * np.pi * (month.ravel() - 1) / 12),
+    })
+    return clf.predict(X).reshape(T_out.shape)
+
+
+def enterprise_usage(agent, datetimes, is_weekend):
+    """
+    EnterpriseBuildingAgent.predict_usage для ряда часовых меток, кВт·ч.
+    Как и в агенте, метки вне плана сопоставляются по часу недели (alignment.py).
+    """
+    return agent.predict_hours(datetimes, is_weekend)
+
+
+# ------------------------------ JIT-ядро (Numba) ---------------------------------------
+#
+# Те же формулы в виде явных циклов по (здания × часы) в порядке операций
+# step() агентов. С Numba циклы компилируются, без неё *_energy используют
+# NumPy-версии выше. backend: 'auto' (Numba, если установлена), 'numba', 'numpy'.
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+
+@njit(cache=True)
+def _office_loop(area, hour, heating, ppl, pump, vent, light_day, light_night, per_pc, out):
+    for i in range(area.shape[0]):
+        for t in range(hour.shape[0]):
+            night = hour[t] >= 22 or hour[t] < 7
+            heating_load = area[i] * pump if heating[t] else 0.0
+            ventilation_load = area[i] * vent * (0.3 if night else 1.0)
+            lighting_load = area[i] * (light_night if night else light_day)
+            out[i, t] = heating_load + ventilation_load + lighting_load + ppl[t] * per_pc
+
+
+@njit(cache=True)
+def _hospital_loop(hospitalized, patients, heating, beds, heat_norm, base_el, out):
+    for t in range(hospitalized.shape[0]):
+        occ = min(hospitalized[t], beds) / beds
+        pat = patients[t] / max(1, beds)
+        heat_kWh = heat_norm if heating[t] else 0.0
+        el_kWh = base_el * (1 + 0.56 * occ + 0.20 * pat)
+        out[t] = (heat_kWh + el_kWh) * 1000
+
+
+@njit(cache=True)
+def _mall_loop(occ, hour, T_out, heating, floor_area, escalator_count,
+               opening_hour, closing_hour, out):
+    for i in range(floor_area.shape[0]):
+        fa = floor_area[i]
+        for t in range(hour.shape[0]):
+            is_open = opening_hour[i] <= hour[t] and hour[t] < closing_hour[i]
+            lighting_load = (18 if is_open else 1) * fa
+            equipment_load = 15 * fa * (0.2 if occ[t] < 0.2 else occ[t])
+            escalator_load = (5000 if occ[t] > 0.1 else 1800) * escalator_count[i] if is_open else 0.0
+            cooling_load = 60 * fa if T_out[t] > 24 else 0.0
+            electric = (lighting_load + equipment_load + escalator_load +
+                        cooling_load + 4 * fa + 10.8 * fa + 50 * fa)
+            heat = 11.4 * fa if heating[t] else 0.0
+            out[i, t] = (electric + heat) / 1000.0
+
+
+@njit(cache=True)
+def _residential_loop(presence, heating, last_p, light_kw, light_delta_kw, fan_kw, it_kw,
+                      pump_kw, trips, trip_kwh, out):
+    for i in range(presence.shape[0]):
+        prev = last_p[i]
+        for t in range(presence.shape[1]):
+            p = min(max(presence[i, t], 0.0), 1.0)
+            dprs = 0.0 if np.isnan(prev) else abs(p - prev)
+            prev = p
+            kwh = (light_kw + light_delta_kw * dprs + fan_kw + it_kw +
+                   (pump_kw if heating[t] else 0.0) + dprs * trips * trip_kwh)
+            out[i, t] = kwh * 1_000
+
+
+# Что означает backend='auto' (в том числе в функциях реестра): 'auto' —
+# Numba, если установлена; 'numpy' / 'numba' — принудительно (parity.py)
+BACKEND = 'auto'
+
+
+def _use_numba(backend):
+    if backend == 'auto':
+        backend = BACKEND
+    if backend == 'numba' and not NUMBA_AVAILABLE:
+        raise ImportError("Numba не установлена: используйте backend='numpy'")
+    return backend == 'numba' or (backend == 'auto' and NUMBA_AVAILABLE)
+
+
+def office_energy(area, hour, month, day, ppl, backend='auto'):
+    """Офисы: area (N,), входы (T,) → энергия за час (N, T), Вт·ч."""
+    area = np.asarray(area, dtype=float)
+    if not _use_numba(backend):
+        return np.broadcast_to(office_consumption(area[:, None], hour, month, day, ppl),
+                               (len(area), len(hour)))
+    out = np.empty((len(area), len(hour)))
+    _office_loop(area, np.asarray(hour), heating_season(month, day),
+                 np.asarray(ppl, dtype=float), 0.05, 1.0, 10.0, 1.0, 150.0, out)
+    return out
+
+
+def hospital_energy(hospitalized, patients, month, day, backend='auto'):
+    """Больница: входы (T,) → энергия за час (T,), Вт·ч."""
+    if not _use_numba(backend):
+        return hospital_consumption(hospitalized, patients, month, day)
+    h = HospitalBuildingAgent
+    hospitalized = np.asarray(hospitalized, dtype=float)
+    out = np.empty(len(hospitalized))
+    _hospital_loop(hospitalized, np.asarray(patients, dtype=float), heating_season(month, day),
+                   h.BEDS_TOTAL, h._HEAT_HOURLY_NORM, h.EUI_EL_BASE * h.AREA_M2 / 8760.0, out)
+    return out
+
+
+def mall_energy(occ, hour, T_out, month, day, floor_area, escalator_count,
+                opening_hour, closing_hour, backend='auto'):
+    """ТРЦ: occ (доля), входы (T,), параметры (N,) → agent.consumption за час (N, T)."""
+    floor_area = np.asarray(floor_area, dtype=float)
+    params = [np.asarray(p) for p in (escalator_count, opening_hour, closing_hour)]
+    if not _use_numba(backend):
+        return mall_consumption(occ, hour, T_out, month, day, floor_area[:, None],
+                                *(p[:, None] for p in params))
+    out = np.empty((len(floor_area), len(hour)))
+    _mall_loop(np.asarray(occ, dtype=float), np.asarray(hour), np.asarray(T_out, dtype=float),
+               heating_season(month, day), floor_area, *params, out)
+    return out
+
+
+def residential_energy(presence, month, day, modern=False, last_p=None, backend='auto'):
+    """
+    Жилые дома: presence (N, T) → энергия за час (N, T), Вт·ч.
+    last_p (N,) — присутствие на шаге перед рядом (NaN — ряд начинается
+    с первого шага агента: Δ = 0).
+    """
+    presence = np.atleast_2d(np.asarray(presence, dtype=float))
+    n = presence.shape[0]
+    last_p = np.full(n, np.nan) if last_p is None else np.asarray(last_p, dtype=float)
+    if not _use_numba(backend):
+        r = ModernResidentialBuildingAgent if modern else ResidentialBuildingAgent
+        lift_kwh, light_kwh, _ = lift_light_energy(presence, last_p, modern)
+        pump_kw = np.where(heating_season(month, day), r.PUMP_KW, 0.0)
+        return (light_kwh + r.FAN_KW + r.IT_KW + pump_kw + lift_kwh) * 1_000
+    if modern:
+        r = ModernResidentialBuildingAgent
+        consts = (r.LIGHT_STBY_KW, r.LIGHT_DELTA_KW, r.FAN_KW, r.IT_KW, r.PUMP_KW,
+                  r.FULL_PRES_TRIPS, r.ELEV_TRIP_KWH)
+    else:
+        r = ResidentialBuildingAgent
+        consts = (r.LIGHT_KW, 0.0, r.FAN_KW, r.IT_KW, r.PUMP_KW,
+                  r.FULL_PRESENCE_TRIPS, r.ELEV_TRIP_KWH)
+    out = np.empty(presence.shape)
+    _residential_loop(presence, heating_season(month, day), last_p, *consts, out)
+    return out
+
+
+# ------------------------------ Горизонтный режим жилых домов --------------------------
+
+def lift_light_energy(presence, last_p=None, modern=False, hours=1.0):
+    """
+    Лифты и освещение жилых домов по ряду присутствия (N, T) сразу за весь
+    горизонт, кВт·ч за шаг. Δ присутствия — через np.diff; last_p (N,) —
+    присутствие на шаге перед рядом (NaN — первый шаг агента: Δ = 0,
+    лифт не ездит). Возвращает (lift, light, last_p для следующего куска).
+    """
+    presence = np.clip(np.atleast_2d(np.asarray(presence, dtype=float)), 0.0, 1.0)
+    n = presence.shape[0]
+    last_p = np.full(n, np.nan) if last_p is None else np.asarray(last_p, dtype=float)
+    first = np.where(np.isnan(last_p), presence[:, 0], last_p)
+    dprs = np.abs(np.diff(presence, axis=1, prepend=first[:, None]))
+    if modern:
+        r = ModernResidentialBuildingAgent
+        lift = dprs * r.FULL_PRES_TRIPS * r.ELEV_TRIP_KWH
+        light = r.LIGHT_STBY_KW * hours + r.LIGHT_DELTA_KW * dprs
+    else:
+        r = ResidentialBuildingAgent
+        lift = dprs * r.FULL_PRESENCE_TRIPS * r.ELEV_TRIP_KWH
+        light = np.full(dprs.shape, r.LIGHT_KW * hours)
+    return lift, light, presence[:, -1].copy()
+
+
+class ResidentialHorizon:
+    """
+    Жилые дома (обычные и современные) пачкой по горизонту вместо пошагового
+    _lift_kw. Ряд присутствия можно подавать кусками (потоковый режим):
+    последнее присутствие каждого дома переносится в следующий кусок,
+    поэтому результат не зависит от разбиения на куски.
+
+        horizon = ResidentialHorizon(agents)
+        for chunk in chunks:
+            energy = horizon.advance(chunk['presence'], chunk['month'], chunk['day'])
+        horizon.sync_agents()
+    """
+
+    def __init__(self, agents):
+        self.agents = list(agents)
+        self.modern = np.array([isinstance(a, ModernResidentialBuildingAgent) for a in self.agents])
+        self.last_p = np.array([np.nan if a._last_p is None else a._last_p for a in self.agents],
+                               dtype=float)
+        self.last_energy = np.zeros(len(self.agents))
+
+    def advance(self, presence, month, day, hours=1.0):
+        """
+        Энергия за шаги куска, Вт·ч: (N, T). presence — общий ряд (T,) или
+        по домам (N, T); hours — длительность шага модели.
+        """
+        month, day = np.asarray(month), np.asarray(day)
+        presence = np.broadcast_to(np.asarray(presence, dtype=float), (len(self.agents), len(month)))
+        heating = heating_season(month, day)
+        out = np.empty(presence.shape)
+        for modern in (False, True):
+            mask = self.modern == modern
+            if not mask.any():
+                continue
+            r = ModernResidentialBuildingAgent if modern else ResidentialBuildingAgent
+            lift, light, self.last_p[mask] = lift_light_energy(presence[mask], self.last_p[mask],
+                                                               modern, hours)
+            pump = np.where(heating, r.PUMP_KW * hours, 0.0)
+            out[mask] = (light + r.FAN_KW * hours + r.IT_KW * hours + pump + lift) * 1_000
+        if out.shape[1]:
+            self.last_energy = out[:, -1].copy()
+        return out
+
+    def sync_agents(self):
+        """Переносит состояние обратно в агентов (для продолжения пошагового режима)."""
+        for agent, last_p, energy in zip(self.agents, self.last_p, self.last_energy):
+            agent._last_p = None if np.isnan(last_p) else float(last_p)
+            agent.consumption = float(energy)
+
+
+if __name__ == '__main__':
+    # Проверка совпадения ядер с классами агентов: python kernels.py
+    # (код выхода 1 при расхождении сверх |Δ| ≤ ATOL + RTOL·|эталон|, как у
+    # режимов batch-numpy / batch-numba в parity.py)
+    import sys
+    import time
+    from model import EnergyConsumptionModel
+
+    HOURS = 24 * 28
+    RTOL, ATOL = 1e-12, 1e-9
+    START = pd.Timestamp('2021-03-20 00:00')
+    # Суточный профиль присутствия (с выходом за [0, 1]), чтобы проверить лифты и свет
+    stamps = pd.date_range(START, periods=HOURS, freq='1h')
+    presence = pd.Series(0.55 - 0.6 * np.cos(2 * np.pi * stamps.hour / 24), index=stamps)
+    model = EnergyConsumptionModel(
+        buildings={'office': 4, 'hospital': 1,
+                   'mall': {'count': 2, 'floor_area': 20000, 'opening_hour': 8},
+                   'modern_residential': 2, 'residential': 2},
+        start_datetime=START,
+        environment_overrides={'presence_in_building': presence},
+    )
+    env = model.environment_arrays(HOURS)
+    by_type = {}
+    for agent in model.agents:
+        by_type.setdefault(type(agent).__name__, []).append(agent)
+
+    started = time.perf_counter()
+    reference = {name: np.empty((len(agents), HOURS)) for name, agents in by_type.items()}
+    for t in range(HOURS):
+        model.step()
+        for name, agents in by_type.items():
+            reference[name][:, t] = [a.consumption for a in agents]
+    agents_s = time.perf_counter() - started
+
+    hour, month, day = env['hour'], env['month'], env['day']
+    malls = by_type['MallAgent']
+    occ = mall_occupancy(malls[0].occ_clf, env['T_out'], env['day_off'], hour, env['dow'], month) / 100
+    ppl = env['office_population'] / model.num_office_agents
+
+    def check(label, values, expected):
+        diff = np.abs(np.broadcast_to(values, expected.shape) - expected)
+        ok = bool((diff <= ATOL + RTOL * np.abs(expected)).all())
+        print(f"{label:38s} max |Δ| = {diff.max():.3g}{'' if ok else '  РАСХОЖДЕНИЕ'}")
+        return ok
+
+    failed = False
+    backends = ['numpy'] + (['numba'] if NUMBA_AVAILABLE else [])
+    for backend in backends:
+        run = lambda: {
+            'OfficeBuildingAgent': office_energy(
+                [a.area for a in by_type['OfficeBuildingAgent']], hour, month, day, ppl, backend),
+            'HospitalBuildingAgent': hospital_energy(
+                env['hospitalized'], env['patients'], month, day, backend)[None, :],
+            'MallAgent': mall_energy(
+                occ, hour, env['T_out'], month, day,
+                [a.floor_area for a in malls], [a.escalator_count for a in malls],
+                [a.opening_hour for a in malls], [a.closing_hour for a in malls], backend),
+            'ModernResidentialBuildingAgent': residential_energy(
+                np.tile(env['presence'], (2, 1)), month, day, modern=True, backend=backend),
+            'ResidentialBuildingAgent': residential_energy(
+                np.tile(env['presence'], (2, 1)), month, day, backend=backend),
+        }
+        run()  # компиляция Numba
+        started = time.perf_counter()
+        result = run()
+        kernel_s = time.perf_counter() - started
+        for name, values in result.items():
+            failed |= not check(f"{backend:5s} {name}", values, reference[name])
+        print(f"{backend:5s} {HOURS} h: agents {agents_s:.3f} s, kernels {kernel_s * 1000:.2f} ms")
+
+    # Горизонтный режим жилых домов кусками по 100 ч с переносом last_p
+    homes = by_type['ModernResidentialBuildingAgent'] + by_type['ResidentialBuildingAgent']
+    expected = np.vstack([reference['ModernResidentialBuildingAgent'],
+                          reference['ResidentialBuildingAgent']])
+    horizon = ResidentialHorizon(homes)
+    horizon.last_p[:] = np.nan  # с начала ряда, как у новых агентов
+    chunks = [horizon.advance(env['presence'][i:i + 100], month[i:i + 100], day[i:i + 100])
+              for i in range(0, HOURS, 100)]
+    failed |= not check("horizon ResidentialHorizon (100 h chunks)", np.hstack(chunks), expected)
+    sys.exit(1 if failed else 0)
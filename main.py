@@ -1,15 +1,20 @@
 import os 
+import json
 import time
 import pandas as pd
 from datetime import datetime
 from model import EnergyConsumptionModel
+import results
 
 if __name__ == '__main__':
 
 
     # Параметры симуляции
     START = datetime(2021, 1, 1, 0, 0)
-    STEPS = 24 * 365  # симуляция на одну неделю
+    FREQ  = '1h'      # шаг: '15min' для пиков, '1D' для многолетних прогонов
+    YEARS = 1         # горизонт может выходить за годы погоды и плана (alignment.py)
+    STEPS = int((START + pd.DateOffset(years=YEARS) - START) / pd.Timedelta(FREQ))
+    COMPACT = None    # 'float32' или 'int32' — компактный сбор consumption (иначе float64)
 
     # Инициализируем и запускаем модель
     model = EnergyConsumptionModel(
@@ -20,7 +25,12 @@ if __name__ == '__main__':
         n_modern_residential=1,
         n_residential=1,
         start_datetime=START,
-        weather_path=os.path.join('data', 'environment_data.csv')
+        weather_path=os.path.join('data', 'environment_data.npz'),
+        freq=FREQ,
+        skip_idle=True,
+        compact=COMPACT,
+        collect='post',       # один снимок после шагов агентов, с меткой самого шага
+        horizon_steps=STEPS
     )
     # Засекаем время выполнения симуляции
     start_time = time.time()
@@ -29,24 +39,34 @@ if __name__ == '__main__':
     elapsed = time.time() - start_time
 
     print(f"Simulation completed in {elapsed:.2f} seconds.")
+    stats = model.step_stats
+    print(f"Agent steps: computed={stats['computed']}, skipped={stats['skipped']}")
 
     # 1) Переносим model vars в DataFrame и сохраняем
     model_df = model.datacollector.get_model_vars_dataframe()
     model_df.reset_index(inplace=True)                      # превращаем индекс Step в колонку
     model_df.rename(columns={'index': 'Step'}, inplace=True)
+    # Метки времени — start + Step · шаг: в CSV не пишутся построчно, а один раз
+    # в output/run_meta.json; восстановить колонку:
+    #   pd.Timestamp(meta['start']) + df['Step'] * pd.Timedelta(meta['freq'])
+    with open('output/run_meta.json', 'w', encoding='utf-8') as f:
+        json.dump({'start': model.start_datetime.isoformat(), 'freq': FREQ, 'steps': STEPS,
+                   'datetime': 'start + Step * freq'}, f, indent=2)
     # Убедимся, что колонки в порядке:
-    model_df = model_df[['Step', 'datetime', 'office_population', 'hospitalized', 'patients_total']]
+    model_df = model_df[['Step', 'office_population', 'hospitalized', 'patients_total']]
     model_df.to_csv('output/model_data.csv', index=False)
 
-    # 2) Переносим agent vars, добавляем datetime и сохраняем
-    agent_df = model.datacollector.get_agent_vars_dataframe()
-    agent_df.reset_index(inplace=True)                      # добавляет колонки Step и agent_id
-    # Переименуем agent_id в AgentID
-    agent_df.rename(columns={'agent_id': 'AgentID'}, inplace=True)
-    # Подтягиваем datetime из model_df по Step
-    agent_df = agent_df.merge(model_df[['Step', 'datetime']], on='Step')
-    # Переупорядочим колонки
-    agent_df = agent_df[['Step', 'datetime', 'AgentID', 'AgentType', 'consumption']]
-    agent_df.to_csv('output/agent_data.csv', index=False)
-
-    print('Data saved to output/model_data.csv and output/agent_data.csv')
+    # 2) consumption агентов: матрица шаги × агенты переводится в pandas только здесь;
+    #    Step совпадает с model_df, склейка не нужна
+    print(f"Agent results: {model.results.nbytes / 2**20:.1f} MiB")
+    agent_df = model.results.to_frame()
+    agent_df.drop(columns='datetime').to_csv('output/agent_data.csv', index=False)
+
+    # Хранилищу (партиции по времени) метки нужны в памяти
+    model_df.insert(1, 'datetime', model.step_datetime(model_df['Step']))
+
+    # 3) Индексированное хранилище для быстрых выборок (results.load)
+    results.write_results(agent_df, model_df, freq=FREQ)
+
+    print(f'Data saved to output/model_data.csv, output/agent_data.csv, output/run_meta.json '
+          f'and {results.RESULTS_DIR}')
@@ -1,20 +1,64 @@
 import os
 import pandas as pd
 import numpy as np
-from datetime import timedelta
+from collections import defaultdict
 from mesa import Model, DataCollector
 
-from EnterpriseBuilding.agent import EnterpriseBuildingAgent
-from OfficeBuilding.agent import OfficeBuildingAgent
-from HospitalBuilding.agent import HospitalBuildingAgent
-from MallBuilding.agent import MallAgent
-from ModernResidentialBuilding.agent import ModernResidentialBuildingAgent
-from ResidentialBuilding.agent import ResidentialBuildingAgent
+from environment_data import load_environment, resample_environment, day_off_flags
+from alignment import align_by_day_of_year
+from kernels import heating_season
+from seeding import DEFAULT_SEED, agent_rng
+from results import CompactResults
+import registry
+from population import read_population, validate_population, create_agents
+
 
 class EnergyConsumptionModel(Model):
     """
     Модель для симуляции энергопотребления различных типов зданий-агентов.
+
+    Шаг задаётся freq ('15min', '1h', '1D', ...): окружение один раз
+    приводится к этому шагу, а agent.consumption — энергия за шаг
+    (при часовом шаге — прежние значения).
+
+    При skip_idle=True агенты, объявившие STEADY_INPUTS (атрибуты модели)
+    и STEADY_STATE (своё состояние), не пересчитываются, пока эти значения
+    не изменятся: consumption остаётся с прошлого шага. Счётчики
+    пересчитанных и пропущенных шагов агентов — в step_stats.
+
+    district — имя района (фидера, подстанции), к которому относятся здания
+    модели; environment_overrides — собственные входы района: {колонка:
+    число или Series по datetime}, заменяют колонки погодного файла.
+
+    aggregators — потоковые агрегаторы (см. aggregators.py), обновляются
+    после каждого шага суммами по (AgentType, район); collect_agents=False
+    отключает сбор consumption по каждому агенту в DataCollector.
+
+    compact='float32' | 'int32' — consumption по агентам собирается не в
+    DataCollector, а в компактную матрицу self.results (results.CompactResults;
+    для int32 хранится round(consumption * compact_scale)). При
+    collect_agents=False consumption по агентам не собирается ни в каком виде.
+
+    collect='pre' — DataCollector вызывается до шагов агентов (исторический
+    порядок: на шаге s записано consumption шага s - 1). collect='post' —
+    один снимок после шагов всех агентов: переменные модели — в DataCollector,
+    consumption — в self.results (float64 или compact) с меткой самого шага
+    (step_datetime); horizon_steps — ожидаемое число шагов, под которое
+    массивы выделяются заранее.
+
+    buildings — здания по типам реестра (registry.py): {'office': 3,
+    'mall': {'count': 2, 'floor_area': 20000}, ...}; если не задан,
+    используются n_enterprises … n_residential. population — таблица зданий
+    (путь к CSV/.npz или DataFrame, см. population.py) с типом, площадью,
+    параметрами и районом каждого здания; заменяет buildings.
+
+    seed — корневой seed модели: случайные параметры зданий (площади офисов)
+    берутся из потоков, выведенных из него по типу и номеру здания
+    (seeding.py, agent_rng), и не зависят от порядка unique_id.
     """
+    # Горизонт одного блока предвычисленных входов окружения
+    ENV_BLOCK_DAYS = 28
+
     def __init__(
         self,
         n_enterprises=1,
@@ -24,16 +68,45 @@ class EnergyConsumptionModel(Model):
         n_modern_residential=1,
         n_residential=1,
         start_datetime=pd.to_datetime('2023-01-01 00:00'),
-        weather_path=os.path.join('data', 'environment_data.csv')
+        weather_path=os.path.join('data', 'environment_data.npz'),
+        freq='1h',
+        skip_idle=False,
+        district=None,
+        environment_overrides=None,
+        aggregators=None,
+        collect_agents=True,
+        compact=None,
+        compact_scale=1.0,
+        buildings=None,
+        population=None,
+        seed=DEFAULT_SEED,
+        collect='pre',
+        horizon_steps=None
     ):
-        super().__init__()
-        # Текущее время моделирования
+        super().__init__(seed=seed)
+        # Корневой seed: из него выводятся потоки случайных чисел зданий (agent_rng)
+        self.seed = seed
+        self._type_names = {bt.agent_class: name for name, bt in registry.REGISTRY.items()}
+        # Текущее время моделирования и длительность шага
         self.current_datetime = start_datetime
+        self.start_datetime = pd.Timestamp(start_datetime)
+        # Номер текущего шага от start_datetime (0 — первый шаг)
+        self.step_index = 0
+        self.freq = freq
+        self.step_delta = pd.Timedelta(freq)
+        self.step_hours = self.step_delta / pd.Timedelta(hours=1)
+        if self.step_hours < 1 and pd.Timedelta(hours=1) % self.step_delta:
+            raise ValueError(f"Шаг {freq} должен делить час нацело")
+        if self.step_hours >= 1 and (not self.step_hours.is_integer() or 24 % self.step_hours):
+            raise ValueError(f"Шаг {freq} должен быть целым числом часов, делящим сутки")
         # Загружаем погодные данные (T_out, day_off, WeekStatus, office_population, hospitalized, patients_total)
-        self.weather_df = (
-            pd.read_csv(weather_path, parse_dates=['datetime'])
-              .set_index('datetime')
-        )
+        # Поддерживаются CSV и колоночный .npz из environment_data.py; приводим к шагу модели
+        weather_df = load_environment(weather_path)
+        for col, value in (environment_overrides or {}).items():
+            weather_df[col] = value.reindex(weather_df.index) if isinstance(value, pd.Series) else value
+        self.weather_df = resample_environment(weather_df, self.step_delta)
+        self.district = district
+        self._update_step_clock()
         # Параметры окружения, обновляются на каждом шаге
         self.current_weather = {}
         self.current_WeekStatus = 'Weekday'
@@ -42,38 +115,51 @@ class EnergyConsumptionModel(Model):
         self.hospitalized = 0
         self.patients = 0
         self.presence_in_building = 0
+        self.heating_season = False
 
-        # Количество офисных агентов нужно доступно внутри OfficeBuildingAgent
-        self.num_office_agents = n_offices
+        # Пропуск пересчёта агентов в установившемся режиме
+        self.skip_idle = skip_idle
+        self.step_stats = {'computed': 0, 'skipped': 0}
 
-        # Инициализация агентов
-        for _ in range(n_enterprises):
-            agent = EnterpriseBuildingAgent(self)
-            self.agents.add(agent)
-        for _ in range(n_offices):
-            agent = OfficeBuildingAgent(self)
-            self.agents.add(agent)
+        # Потоковые агрегаты нагрузки
+        self.aggregators = list(aggregators or [])
 
-        for _ in range(n_hospitals):
-            agent = HospitalBuildingAgent(self)
-            self.agents.add(agent)
+        # Здания создаются по реестру типов (registry.py) в порядке регистрации:
+        # из таблицы зданий (population) или по количествам
+        if population is not None:
+            if isinstance(population, str):
+                population = read_population(population)
+            groups = validate_population(population)
+            self.buildings = {name: (len(g['district']), {}) for name, g in groups.items()}
+        else:
+            if buildings is None:
+                buildings = {
+                    'enterprise': n_enterprises,
+                    'office': n_offices,
+                    'hospital': n_hospitals,
+                    'mall': n_malls,
+                    'modern_residential': n_modern_residential,
+                    'residential': n_residential,
+                }
+            self.buildings = registry.normalize_config(buildings)
 
-        for _ in range(n_malls):
-            agent = MallAgent(self)
-            self.agents.add(agent)
-
-        for _ in range(n_modern_residential):
-            agent = ModernResidentialBuildingAgent(self)
-            self.agents.add(agent)
+        # Количество офисных агентов нужно доступно внутри OfficeBuildingAgent
+        self.num_office_agents = self.buildings.get('office', (0, {}))[0]
 
-        for _ in range(n_residential):
-            agent = ResidentialBuildingAgent(self)
-            self.agents.add(agent)
+        # Инициализация агентов
+        for name, (count, params) in self.buildings.items():
+            building_type = registry.get(name)
+            if population is not None:
+                group = groups[name]
+                create_agents(self, building_type, group['params'], group['district'])
+                continue
+            for _ in range(count):
+                agent = building_type.agent_class(self, **params)
+                self.agents.add(agent)
 
         # DataCollector: собираем данные моделей и агентов
         self.datacollector = DataCollector(
             model_reporters={
-                'datetime': lambda m: m.current_datetime,
                 'office_population':    lambda m: m.current_office_population,
                 'hospitalized':         lambda m: m.hospitalized,
                 'patients_total':       lambda m: m.patients,
@@ -82,37 +168,256 @@ class EnergyConsumptionModel(Model):
             agent_reporters={
                 'AgentType':   lambda a: type(a).__name__,  
                 'consumption': lambda a: a.consumption
-            }
+            } if collect_agents and compact is None and collect == 'pre' else {}
         )
 
+        # Сбор consumption в матрицу шаги × агенты. При collect='pre' метки
+        # времени — как при прежней склейке agent_df с model_df по Step
+        # (Step s → start + s * шаг), при 'post' — метка самого шага.
+        if collect not in ('pre', 'post'):
+            raise ValueError(f"collect должен быть 'pre' или 'post', получено {collect!r}")
+        self.collect = collect
+        self.results = None
+        if collect_agents and (compact is not None or collect == 'post'):
+            self._result_agents = list(self.agents)
+            post = collect == 'post'
+            self.results = CompactResults(
+                agent_ids=[a.unique_id for a in self._result_agents],
+                agent_types=[type(a).__name__ for a in self._result_agents],
+                start=start_datetime if post else start_datetime + self.step_delta,
+                freq=self.step_delta,
+                first_step=0 if post else 1,
+                dtype=compact or 'float64',
+                scale=compact_scale,
+                capacity=horizon_steps or 1024,
+            )
 
-    def step(self):
-        # Обновление переменных окружения из погодного датафрейма
-        try:
-            row = self.weather_df.loc[self.current_datetime]
-            # Температура и другие погодные параметры
-            self.current_weather = row.to_dict()
-            self.current_T_out = row.get('T_out', 0.0)
-            self.current_WeekStatus = row.get('WeekStatus', 'Weekday')
-            self.current_day_off = bool(row.get('day_off', False))
-            # Специфичные параметры для офисов и больницы
-            self.current_office_population = row.get('office_population', 0)
-            self.hospitalized = row.get('hospitalized', 0)
-            self.patients_total = row.get('patients_total', 0)
-        except KeyError:
-            # При отсутствии строки — устанавливаем дефолтные значения
-            self.current_weather = {'T_out': 0.0}
-            self.current_T_out = 0.0
-            self.current_WeekStatus = 'Weekday'
-            self.current_day_off = False
-            self.current_office_population = 0
-            self.hospitalized = 0
-            self.patients_total = 0
-        
+
+    def _aligned_environment(self, index):
+        """
+        Входы окружения для меток index массивами. Строки погодного ряда
+        сопоставляются по дню года (alignment.py), поэтому горизонт может
+        выходить за годы погодного файла; у сопоставленных (не точных) дат
+        day_off и WeekStatus считаются по их собственному календарю. Где
+        строки нет — значения по умолчанию, presence — NaN (не меняется).
+        """
+        weather = self.weather_df
+        positions = align_by_day_of_year(weather.index, index)
+        found = positions >= 0
+        rows = np.where(found, positions, 0)
+        exact = found & (weather.index.to_numpy()[rows] == index.to_numpy())
+
+        def column(name, default):
+            if name not in weather.columns:
+                return np.full(len(index), default)
+            return np.where(found, weather[name].to_numpy()[rows], default)
+
+        day_off = column('day_off', False).astype(bool)
+        week_status = column('WeekStatus', 'Weekday')
+        if 'day_off' in weather.columns and not exact[found].all():
+            day_off = np.where(exact | ~found, day_off, day_off_flags(index))
+        if 'WeekStatus' in weather.columns and not exact[found].all():
+            week_status = np.where(exact | ~found, week_status,
+                                   np.where(index.dayofweek >= 5, 'Weekend', 'Weekday'))
+        return {
+            'datetime':          index,
+            'hour':              index.hour.to_numpy(),
+            'dow':               index.dayofweek.to_numpy(),
+            'day':               index.day.to_numpy(),
+            'month':             index.month.to_numpy(),
+            'doy':               index.dayofyear.to_numpy(),
+            'found':             found,
+            'T_out':             column('T_out', 0.0).astype(float),
+            'day_off':           day_off,
+            'WeekStatus':        week_status,
+            'is_weekend':        week_status != 'Weekday',
+            'office_population': column('office_population', 0),
+            'hospitalized':      column('hospitalized', 0),
+            'patients_total':    column('patients_total', 0),
+            'presence':          column('presence_in_building', np.nan).astype(float),
+        }
+
+    def environment_arrays(self, steps):
+        """
+        Входы окружения, которые агенты увидят на ближайших steps шагах,
+        в виде массивов (с теми же значениями по умолчанию, что и в step()).
+        """
+        index = pd.date_range(self.current_datetime, periods=steps, freq=self.step_delta)
+        env = self._aligned_environment(index)
+        env['office_population'] = env['office_population'].astype(float)
+        env['hospitalized'] = env['hospitalized'].astype(float)
+        # агенты читают model.patients, который step() не меняет
+        env['patients'] = np.full(steps, float(self.patients))
+        env['presence'] = np.where(np.isnan(env['presence']), self.presence_in_building,
+                                   env['presence'])
+        return env
+
+    def step_environment(self):
+        """Входы текущего шага в виде environment_arrays(1), из блока окружения."""
+        i = self.env_block_pos
+        env = {k: v[i:i + 1] for k, v in self.env_block.items() if k != 'hour_stamps'}
+        env['office_population'] = env['office_population'].astype(float)
+        env['hospitalized'] = env['hospitalized'].astype(float)
+        env['patients'] = np.array([float(self.patients)])
+        env['presence'] = np.array([float(self.presence_in_building)])
+        return env
+
+    def batch_consumption(self, steps):
+        """
+        Потребление всех зданий на steps часовых шагов от current_datetime
+        пачкой, через векторные функции реестра: {тип: массив (N, T)}.
+        Жилые дома продолжают ряд присутствия с последнего значения агента
+        (у только что созданных — с нулевого Δ). Состояние агентов не меняется.
+        """
+        if self.step_hours != 1:
+            raise ValueError("Пачечный расчёт ведётся на часовом шаге (freq='1h')")
+        env = self.environment_arrays(steps)
+        result = {}
+        for name in self.buildings:
+            building_type = registry.get(name)
+            agents = list(self.agents_by_type.get(building_type.agent_class, []))
+            if agents and building_type.batch is not None:
+                params = registry.agent_params(building_type, agents)
+                result[name] = building_type.batch(self, env, params, agents)
+        return result
+
+    def _build_env_block(self):
+        """
+        Предвычисляет входы окружения на ENV_BLOCK_DAYS вперёд от current_datetime:
+        сопоставленные строки погоды, часовые метки шагов, отопительный сезон.
+        Шаг модели только читает элементы массивов блока.
+        """
+        n = max(1, int(pd.Timedelta(days=self.ENV_BLOCK_DAYS) / self.step_delta))
+        index = pd.date_range(self.current_datetime, periods=n, freq=self.step_delta)
+        block = self._aligned_environment(index)
+        # часовые метки шага: при шаге ≤ 1 ч — один час, при суточном — 24
+        n_hours = max(1, int(self.step_hours))
+        first_hour = index.floor('h')
+        block['hour_stamps'] = (first_hour.to_numpy()[:, None] +
+                                np.arange(n_hours) * np.timedelta64(1, 'h'))
+        block['hours_of_day'] = (first_hour.hour.to_numpy()[:, None] + np.arange(n_hours)) % 24
+        block['heating'] = heating_season(block['month'], block['day'])
+        self.env_block = block
+        self.env_block_pos = 0
+
+    def _update_step_clock(self):
+        """
+        Часовые метки, которые покрывает текущий шаг, и вес каждой в часах:
+        при шаге ≤ 1 ч — один час с весом step_hours, при суточном — 24 часа по 1.
+        Значения берутся из блока окружения; новый блок строится, когда текущий
+        закончился (или часы модели переставили вручную).
+        """
+        block = getattr(self, 'env_block', None)
+        if (block is None or self.env_block_pos >= len(block['datetime']) or
+                block['datetime'][self.env_block_pos] != self.current_datetime):
+            self._build_env_block()
+        i = self.env_block_pos
+        self.step_hour_stamps = self.env_block['hour_stamps'][i]
+        self.step_hours_of_day = self.env_block['hours_of_day'][i]
+        self.step_hour_weight = min(self.step_hours, 1.0)
+        # Отопительный сезон: 15 октября – 15 апреля
+        self.heating_season = bool(self.env_block['heating'][i])
+
+    def window_hours(self, start_hour, end_hour):
+        """
+        Сколько часов текущего шага попадает в суточное окно [start_hour, end_hour).
+        Окно может переходить через полночь (например, 22–7).
+        """
+        h = self.step_hours_of_day
+        if start_hour <= end_hour:
+            inside = (h >= start_hour) & (h < end_hour)
+        else:
+            inside = (h >= start_hour) | (h < end_hour)
+        return float(np.count_nonzero(inside)) * self.step_hour_weight
+
+    def _steady_key(self, agent):
+        """Текущие значения входов, от которых агент объявил зависимость."""
+        return (tuple(getattr(self, name) for name in agent.STEADY_INPUTS) +
+                tuple(getattr(agent, name) for name in agent.STEADY_STATE))
+
+    def _update_aggregators(self):
+        """
+        Суммирует consumption по (AgentType, район) и передаёт агрегаторам.
+        Район — собственный у зданий из таблицы зданий, иначе район модели.
+        """
+        loads = defaultdict(float)
+        for agent in self.agents:
+            district = getattr(agent, 'district', None) or self.district
+            loads[(type(agent).__name__, district)] += agent.consumption
+        for aggregator in self.aggregators:
+            aggregator.update(self.current_datetime, loads, self.step_hours)
+
+    def agent_rng(self, agent) -> np.random.Generator:
+        """
+        Поток случайных чисел здания (seeding.py). Ключ — тип здания в реестре
+        и номер здания среди зданий этого типа в порядке создания, а не
+        unique_id. Вызывается из конструктора агента после Agent.__init__.
+        """
+        kind = self._type_names.get(type(agent), type(agent).__name__)
+        index = len(self.agents_by_type[type(agent)]) - 1
+        return agent_rng(self.seed, kind, index)
+
+    def prepare_step(self):
+        """
+        Выставляет часы шага и входы окружения текущего шага (элементы
+        предвычисленного блока) — всё, что агенты читают в step().
+        Календарь шага (час, день недели, день, месяц, день года) — готовые
+        целые из блока: агентам не нужно разбирать current_datetime.
+        """
+        self._update_step_clock()
+        env, i = self.env_block, self.env_block_pos
+        self.current_hour = env['hour'][i]
+        self.current_dow = env['dow'][i]
+        self.current_day = env['day'][i]
+        self.current_month = env['month'][i]
+        self.current_doy = env['doy'][i]
+        self.current_T_out = env['T_out'][i]
+        self.current_weather = {'T_out': self.current_T_out}
+        self.current_WeekStatus = env['WeekStatus'][i]
+        self.current_day_off = bool(env['day_off'][i])
+        # Специфичные параметры для офисов и больницы
+        self.current_office_population = env['office_population'][i]
+        self.hospitalized = env['hospitalized'][i]
+        self.patients_total = env['patients_total'][i]
+        if not np.isnan(env['presence'][i]):
+            self.presence_in_building = env['presence'][i]
+
+    def finish_step(self):
+        """Переводит часы модели на следующий шаг."""
+        self.current_datetime += self.step_delta
+        self.env_block_pos += 1
+        self.step_index += 1
+
+    def step_datetime(self, steps) -> np.ndarray:
+        """Метки шагов с номерами steps (step_index): start_datetime + steps · шаг."""
+        steps = np.asarray(steps, dtype=np.int64)
+        return np.datetime64(self.start_datetime, 'ns') + steps * np.timedelta64(self.step_delta)
+
+    def _snapshot(self):
         self.datacollector.collect(self)
+        if self.results is not None:
+            self.results.append(np.fromiter((a.consumption for a in self._result_agents),
+                                            dtype=float, count=len(self._result_agents)))
+
+    def step(self):
+        self.prepare_step()
+        if self.collect == 'pre':
+            self._snapshot()
 
         for agent in self.agents:
+            if self.skip_idle and hasattr(agent, 'STEADY_INPUTS'):
+                key = self._steady_key(agent)
+                if key == getattr(agent, '_steady_key', None):
+                    self.step_stats['skipped'] += 1
+                    continue
+                agent._steady_key = key
             agent.step()
-        # Переходим к следующему часу
-        self.current_datetime += timedelta(hours=1)
+            self.step_stats['computed'] += 1
+
+        if self.collect == 'post':
+            self._snapshot()
+        if self.aggregators:
+            self._update_aggregators()
+        # Переходим к следующему шагу
+        self.finish_step()
         
\ No newline at end of file
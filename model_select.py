@@ -0,0 +1,310 @@
+"""
+Выбор обученной модели с учётом точности, задержки и размера.
+
+train_models сравнивают кандидатов не только по RMSE: для каждого
+measure измеряет задержку predict на одной строке (шаг агента) и на
+8760 строках (год по часам — блок окружения, пакетные ядра) и размер
+pickle, который загружает каждый процесс модели. select_model выбирает
+кандидата с наименьшей задержкой (или размером) среди укладывающихся в
+бюджет RMSE; без бюджета — как раньше, обученную модель с наименьшим RMSE.
+
+Кроме обученных моделей кандидатами становятся облегчённые варианты
+лучшего ансамбля деревьев (variants):
+  - усечённый — первые деревья ансамбля, без переобучения;
+  - дистиллированный — небольшой бустинг неглубоких деревьев, обученный
+    на предсказаниях исходной модели;
+  - таблица (LookupRegressor) — предсказания ансамбля, заранее
+    посчитанные на всех сочетаниях дискретных признаков и интервалах
+    непрерывного признака между порогами деревьев. Для деревьев такая
+    таблица точная: predict сводится к чтению из массива. Таблица с
+    равной сеткой и интерполяцией (lookup_within) подходит любому
+    регрессору, её ошибка измеряется и ограничивается.
+
+    axes = [CyclicAxis('hour_sin', 'hour_cos', 24), ValueAxis('day_off', [0, 1])]
+    table = LookupRegressor(model, axes, continuous='T_out')
+    # равная сетка с интерполяцией: интервалов столько, чтобы ошибка на X была ≤ 0.5
+    table = lookup_within(model, axes, 'T_out', X, tolerance=0.5)
+"""
+import copy
+import pickle
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+BATCH_ROWS = 8760
+OBJECTIVES = ('latency_row_ms', 'latency_batch_ms', 'size_kb')
+
+
+# ------------------------------ Замеры и выбор -----------------------------------------
+
+def _best_time(fn, repeats: int) -> float:
+    best = np.inf
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def measure(model, X: pd.DataFrame, batch: int = BATCH_ROWS, repeats: int = 5) -> dict:
+    """
+    Задержка model.predict в мс (лучшая из repeats попыток) на одной строке
+    X и на batch строках (X по кругу) и размер pickle модели в КБ.
+    """
+    row = X.iloc[:1]
+    rows = X.iloc[np.arange(batch) % len(X)]
+    model.predict(row)  # прогрев
+    return {
+        'latency_row_ms': 1e3 * _best_time(lambda: model.predict(row), 10 * repeats),
+        'latency_batch_ms': 1e3 * _best_time(lambda: model.predict(rows), repeats),
+        'size_kb': len(pickle.dumps(model)) / 1024,
+    }
+
+
+def select_model(results, rmse_budget: float | None = None,
+                 rmse_tolerance: float | None = None, objective: str = 'latency_row_ms'):
+    """
+    Выбор из results (словари с 'rmse', метриками measure и 'variant' у
+    облегчённых вариантов).
+
+    Бюджет RMSE — rmse_budget или лучший RMSE × (1 + rmse_tolerance). Без
+    бюджета — обученная модель с наименьшим RMSE; с бюджетом — кандидат с
+    наименьшим objective среди уложившихся (если таких нет — наименьший RMSE).
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective должен быть одним из {OBJECTIVES}, получено {objective!r}")
+    best = min(results, key=lambda r: r['rmse'])
+    if rmse_budget is None and rmse_tolerance is None:
+        return min((r for r in results if not r.get('variant')), key=lambda r: r['rmse'])
+    budget = rmse_budget if rmse_budget is not None else best['rmse'] * (1 + rmse_tolerance)
+    fit = [r for r in results if r['rmse'] <= budget]
+    if not fit:
+        return best
+    return min(fit, key=lambda r: (r[objective], r['rmse']))
+
+
+def format_result(r) -> str:
+    line = f"{r['name']:28} RMSE={r['rmse']:.3f}  R2={r['r2']:.3f}"
+    if 'size_kb' in r:
+        line += (f"  row={r['latency_row_ms']:.3f} ms  batch={r['latency_batch_ms']:.2f} ms  "
+                 f"size={r['size_kb']:.1f} KB")
+    return line
+
+
+# ------------------------------ Облегчённые варианты -----------------------------------
+
+def _trees(model) -> list:
+    if isinstance(model, GradientBoostingRegressor):
+        return list(model.estimators_.ravel())
+    if isinstance(model, RandomForestRegressor):
+        return list(model.estimators_)
+    if isinstance(model, DecisionTreeRegressor):
+        return [model]
+    raise TypeError(f"Ожидался ансамбль деревьев, получено {type(model).__name__}")
+
+
+def truncated(model, n_trees: int):
+    """Копия ансамбля только с первыми n_trees деревьями (ступенями бустинга)."""
+    small = copy.deepcopy(model)
+    if isinstance(model, GradientBoostingRegressor):
+        small.estimators_ = small.estimators_[:n_trees]
+        small.n_estimators = small.n_estimators_ = len(small.estimators_)
+    elif isinstance(model, RandomForestRegressor):
+        small.estimators_ = small.estimators_[:n_trees]
+        small.n_estimators = len(small.estimators_)
+    else:
+        raise TypeError(f"Ожидался ансамбль деревьев, получено {type(model).__name__}")
+    return small
+
+
+def distilled(teacher, X: pd.DataFrame, n_estimators: int = 30, max_depth: int = 2,
+              learning_rate: float = 0.3):
+    """Небольшой бустинг, обученный повторять предсказания teacher на X."""
+    student = GradientBoostingRegressor(n_estimators=n_estimators, max_depth=max_depth,
+                                        learning_rate=learning_rate, random_state=42)
+    return student.fit(X, teacher.predict(X))
+
+
+def variants(model, X: pd.DataFrame, axes=None, continuous: str | None = None) -> dict:
+    """
+    Облегчённые варианты ансамбля model: {имя: модель}. X — обучающие
+    признаки (для дистилляции). Таблица строится, если заданы оси axes
+    дискретных признаков и непрерывный признак continuous.
+    Для моделей не из деревьев вариантов нет.
+    """
+    if not isinstance(model, (GradientBoostingRegressor, RandomForestRegressor)):
+        return {}
+    n = len(_trees(model))
+    out = {f'truncated-{k}': truncated(model, k) for k in sorted({max(n // 2, 1), max(n // 4, 1)})
+           if k < n}
+    out['distilled-30x2'] = distilled(model, X)
+    if axes is not None:
+        out['lookup'] = LookupRegressor(model, axes, continuous)
+    return out
+
+
+# ------------------------------ Табличный предиктор ------------------------------------
+
+class CyclicAxis:
+    """
+    Дискретный признак 0..period-1, закодированный парой колонок
+    sin/cos(2π·v/period) — как час, день недели, месяц - 1 в train_models.
+    """
+
+    def __init__(self, sin: str, cos: str, period: int):
+        self.sin, self.cos, self.period = sin, cos, period
+        self.columns = [sin, cos]
+        self.size = period
+
+    def encode(self, idx) -> dict:
+        return {self.sin: np.sin(2 * np.pi * idx / self.period),
+                self.cos: np.cos(2 * np.pi * idx / self.period)}
+
+    def index(self, X) -> np.ndarray:
+        angle = np.arctan2(np.asarray(X[self.sin], dtype=float), np.asarray(X[self.cos], dtype=float))
+        return np.rint(angle * self.period / (2 * np.pi)).astype(np.int64) % self.period
+
+
+class ValueAxis:
+    """Признак column с конечным набором значений values (по возрастанию)."""
+
+    def __init__(self, column: str, values):
+        self.column = column
+        self.columns = [column]
+        self.values = np.asarray(values)
+        self.size = len(self.values)
+
+    def encode(self, idx) -> dict:
+        return {self.column: self.values[idx]}
+
+    def index(self, X) -> np.ndarray:
+        return np.searchsorted(self.values, np.asarray(X[self.column]))
+
+
+class OneHotAxis:
+    """
+    Категория, закодированная dummy-колонками columns, как
+    get_dummies(drop_first=True): 0 — первая категория (все колонки нулевые),
+    k — единица в колонке columns[k - 1].
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.size = len(self.columns) + 1
+
+    def encode(self, idx) -> dict:
+        return {c: (idx == k + 1).astype(float) for k, c in enumerate(self.columns)}
+
+    def index(self, X) -> np.ndarray:
+        dummies = np.asarray(X[self.columns], dtype=float).reshape(len(X), -1)
+        return np.rint(dummies @ np.arange(1, self.size)).astype(np.int64)
+
+
+class LookupRegressor:
+    """
+    Таблица предсказаний teacher по осям дискретных признаков axes и сетке
+    непрерывного признака continuous. predict принимает те же колонки, что
+    и teacher; дискретные значения должны лежать на осях.
+
+    bins=None — сетка из интервалов между порогами деревьев ансамбля
+    teacher по continuous. Внутри интервала при одних дискретных значениях
+    все деревья идут по одним ветвям, поэтому таблица воспроизводит teacher
+    точно (как в sklearn, признак сравнивается с порогами после приведения
+    к float32).
+
+    bins=n — n равных интервалов value_range с линейной интерполяцией
+    между узлами (для любого регрессора); значения вне диапазона берутся
+    по ближайшей границе. Ошибку такой таблицы измеряет measure_error.
+    """
+
+    def __init__(self, teacher, axes, continuous: str, bins: int | None = None,
+                 value_range: tuple | None = None):
+        self.feature_names_in_ = np.asarray(teacher.feature_names_in_, dtype=object)
+        self.axes = list(axes)
+        self.continuous = continuous
+        self.bins = bins
+        covered = [c for a in self.axes for c in a.columns] + [continuous]
+        if sorted(covered) != sorted(self.feature_names_in_):
+            raise ValueError(f"Оси {covered} не совпадают с признаками модели "
+                             f"{list(self.feature_names_in_)}")
+
+        if bins is None:
+            j = list(self.feature_names_in_).index(continuous)
+            self.thresholds = np.unique(np.concatenate(
+                [t.tree_.threshold[t.tree_.feature == j] for t in _trees(teacher)]))
+            points = self._representatives()
+        else:
+            if value_range is None:
+                raise ValueError("Для сетки bins нужен диапазон value_range")
+            points = np.linspace(value_range[0], value_range[1], bins + 1)
+            self.knots = points
+
+        shape = tuple(a.size for a in self.axes) + (len(points),)
+        grid = np.indices(shape).reshape(len(shape), -1)
+        cols = {}
+        for axis, idx in zip(self.axes, grid[:-1]):
+            cols.update(axis.encode(idx))
+        cols[continuous] = points[grid[-1]]
+        X = pd.DataFrame(cols)[list(self.feature_names_in_)]
+        self.table = teacher.predict(X).reshape(shape)
+        self.max_error_ = 0.0 if bins is None else None
+
+    def _representatives(self) -> np.ndarray:
+        """По одному значению float32 в каждом интервале (-∞, t0], (t0, t1], …, (t_last, +∞)."""
+        t = self.thresholds
+        if not len(t):
+            return np.zeros(1)
+        below = t.astype(np.float32)
+        below = np.where(below > t, np.nextafter(below, np.float32(-np.inf)), below)
+        above = np.float32(t[-1])
+        if above <= t[-1]:
+            above = np.nextafter(above, np.float32(np.inf))
+        return np.append(below, above).astype(np.float64)
+
+    def predict(self, X) -> np.ndarray:
+        cell = tuple(a.index(X) for a in self.axes)
+        if self.bins is None:
+            value = np.asarray(X[self.continuous], dtype=np.float32)
+            return self.table[cell + (np.searchsorted(self.thresholds, value, side='left'),)]
+        lo, hi = self.knots[0], self.knots[-1]
+        pos = (np.clip(np.asarray(X[self.continuous], dtype=float), lo, hi) - lo) / (hi - lo) * self.bins
+        i = np.minimum(pos.astype(np.int64), self.bins - 1)
+        w = pos - i
+        return self.table[cell + (i,)] * (1 - w) + self.table[cell + (i + 1,)] * w
+
+    def measure_error(self, teacher, X) -> float:
+        """Наибольшее |predict - teacher.predict| на строках X; сохраняется в max_error_."""
+        self.max_error_ = float(np.max(np.abs(self.predict(X) - teacher.predict(X)), initial=0.0))
+        return self.max_error_
+
+
+def lookup_within(teacher, axes, continuous: str, X, tolerance: float,
+                  bins: int = 16, max_bins: int = 4096) -> LookupRegressor:
+    """
+    Таблица для teacher с измеренной на строках X ошибкой не больше
+    tolerance (в единицах предсказания; max_error_ таблицы — измеренная).
+    Сетка по continuous — диапазон X, число интервалов удваивается от bins
+    до max_bins. Для ансамбля деревьев сетка не крупнее точной таблицы по
+    порогам: если меньшей сеткой не уложиться, берётся точная. Для прочих
+    регрессоров, не уложившихся в max_bins, — ValueError.
+    """
+    exact = None
+    try:
+        exact = LookupRegressor(teacher, axes, continuous)
+        max_bins = min(max_bins, len(exact.thresholds))
+    except TypeError:
+        pass
+    values = np.asarray(X[continuous], dtype=float)
+    value_range = (values.min(), values.max())
+    while tolerance > 0 and bins <= max_bins and value_range[1] > value_range[0]:
+        table = LookupRegressor(teacher, axes, continuous, bins, value_range)
+        if table.measure_error(teacher, X) <= tolerance:
+            return table
+        bins *= 2
+    if exact is None:
+        raise ValueError(f"Таблица до {max_bins} интервалов не укладывается в ошибку "
+                         f"{tolerance} для {type(teacher).__name__}")
+    exact.measure_error(teacher, X)
+    return exact
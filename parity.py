@@ -0,0 +1,213 @@
+"""
+Проверка ускоренных режимов против эталонного пошагового расчёта.
+
+Эталон — EnergyConsumptionModel со значениями по умолчанию: каждый агент
+шагает сам, consumption после каждого шага записывается в матрицу
+агенты × шаги. Каждый ускоренный режим считает те же сценарии своим
+путём; consumption сравнивается поэлементно с допуском режима, при
+расхождении выводится первый шаг и первое здание, где оно появилось.
+Время эталона и режима измеряется на одном и том же горизонте.
+
+    python parity.py                      # все сценарии и режимы
+    python parity.py --scenario spring-1h --mode batch-numba
+
+Новый ускоренный режим добавляется в MODES: функция run(model, steps) →
+(unique_id зданий, матрица здания × шаги), параметры модели и допуск.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+import kernels
+import registry
+from model import EnergyConsumptionModel
+
+BUILDINGS = {
+    'enterprise': 1, 'office': 3, 'hospital': 1,
+    'mall': {'count': 2, 'opening_hour': 8, 'floor_area': 20000},
+    'modern_residential': 2, 'residential': 2,
+}
+
+
+def _presence(freq):
+    """Суточный профиль присутствия на весь 2021 год (с выходом за [0, 1])."""
+    stamps = pd.date_range('2021-01-01', '2021-12-31 23:59', freq=freq)
+    return pd.Series(0.55 - 0.6 * np.cos(2 * np.pi * stamps.hour / 24), index=stamps)
+
+
+# Сценарии: параметры модели и число шагов. Горизонты захватывают конец
+# отопительного сезона, выход за год погодного файла и все шаги модели.
+SCENARIOS = {
+    'spring-1h': dict(steps=24 * 10, start_datetime=datetime(2021, 4, 10), freq='1h',
+                      buildings=BUILDINGS,
+                      environment_overrides={'presence_in_building': _presence('1h')}),
+    'newyear-15min': dict(steps=4 * 24 * 2, start_datetime=datetime(2021, 12, 31), freq='15min',
+                          buildings=BUILDINGS),
+    'autumn-1D': dict(steps=30, start_datetime=datetime(2021, 10, 1), freq='1D',
+                      buildings=BUILDINGS),
+}
+
+
+def _step_all(model, steps):
+    agents = list(model.agents)
+    out = np.empty((len(agents), steps))
+    for t in range(steps):
+        model.step()
+        out[:, t] = [a.consumption for a in agents]
+    return np.array([a.unique_id for a in agents]), out
+
+
+def _compact(model, steps):
+    # collect='pre': строка k матрицы — consumption после шага k - 1 (сбор идёт
+    # до шагов агентов), поэтому нужен лишний шаг; 'post': строка k — шаг k
+    pre = model.collect == 'pre'
+    for _ in range(steps + pre):
+        model.step()
+    return model.results.agent_ids, model.results.consumption()[pre:].T
+
+
+def _batch(backend):
+    def run(model, steps):
+        kernels.BACKEND = backend
+        try:
+            energy = model.batch_consumption(steps)
+        finally:
+            kernels.BACKEND = 'auto'
+        ids, rows = [], []
+        for name, values in energy.items():
+            agents = model.agents_by_type[registry.get(name).agent_class]
+            ids.extend(a.unique_id for a in agents)
+            rows.append(np.broadcast_to(values, (len(agents), steps)))
+        return np.array(ids), np.vstack(rows)
+    return run
+
+
+def _horizon(model, steps, chunk=100):
+    agents = [a for name in ('modern_residential', 'residential')
+              for a in model.agents_by_type.get(registry.get(name).agent_class, [])]
+    env = model.environment_arrays(steps)
+    horizon = kernels.ResidentialHorizon(agents)
+    out = np.hstack([
+        horizon.advance(env['presence'][s:s + chunk], env['month'][s:s + chunk],
+                        env['day'][s:s + chunk], hours=model.step_hours)
+        for s in range(0, steps, chunk)
+    ])
+    return np.array([a.unique_id for a in agents]), out
+
+
+# Ускоренные режимы: run, параметры модели, допуск |Δ| ≤ atol + rtol·|эталон|,
+# ограничения (только часовой шаг, нужна Numba)
+MODES = {
+    'skip-idle':       dict(run=_step_all, kwargs={'skip_idle': True}, rtol=0.0, atol=0.0),
+    'compact-float32': dict(run=_compact, kwargs={'compact': 'float32', 'collect_agents': True},
+                            rtol=1e-6, atol=0.0),
+    'compact-int32':   dict(run=_compact, kwargs={'compact': 'int32', 'collect_agents': True},
+                            rtol=0.0, atol=0.5),
+    'post-snapshot':   dict(run=_compact, kwargs={'collect': 'post', 'collect_agents': True},
+                            rtol=0.0, atol=0.0),
+    'batch-numpy':     dict(run=_batch('numpy'), rtol=1e-12, atol=1e-9, hourly=True),
+    'batch-numba':     dict(run=_batch('numba'), rtol=1e-12, atol=1e-9, hourly=True,
+                            numba=True),
+    'residential-horizon': dict(run=_horizon, rtol=1e-12, atol=1e-9),
+    'enterprise-lookup': dict(run=_step_all, rtol=0.0, atol=0.0, kwargs={
+        'buildings': {**BUILDINGS, 'enterprise': {'count': 1, 'lookup_tolerance': 0.0}}}),
+}
+
+
+def _model(scenario, **kwargs):
+    params = {k: v for k, v in SCENARIOS[scenario].items() if k != 'steps'}
+    return EnergyConsumptionModel(**{'collect_agents': False, **params, **kwargs})
+
+
+def _timed(run, model, steps):
+    started = time.perf_counter()
+    ids, values = run(model, steps)
+    return np.asarray(ids), np.asarray(values, dtype=float), time.perf_counter() - started
+
+
+def reference(scenario):
+    """Эталон сценария: (unique_id, матрица здания × шаги, метки шагов, типы, секунды)."""
+    steps = SCENARIOS[scenario]['steps']
+    model = _model(scenario)
+    stamps = pd.date_range(model.current_datetime, periods=steps, freq=model.step_delta)
+    types = {a.unique_id: type(a).__name__ for a in model.agents}
+    ids, values, seconds = _timed(_step_all, model, steps)
+    return ids, values, stamps, types, seconds
+
+
+def check(scenario, mode, ref=None) -> dict:
+    """
+    Сравнивает режим mode с эталоном на сценарии scenario. Результат:
+    status ('ok', 'diverged', 'skipped'), max_abs, first (первое
+    расхождение: шаг, метка, здание, значения), ref_s и mode_s — время.
+    """
+    spec = MODES[mode]
+    steps = SCENARIOS[scenario]['steps']
+    report = {'scenario': scenario, 'mode': mode, 'status': 'skipped'}
+    if spec.get('numba') and not kernels.NUMBA_AVAILABLE:
+        report['reason'] = 'Numba не установлена'
+        return report
+    probe = _model(scenario, **spec.get('kwargs', {}))
+    if spec.get('hourly') and probe.step_hours != 1:
+        report['reason'] = 'только часовой шаг'
+        return report
+
+    ref_ids, ref_values, stamps, types, ref_s = ref or reference(scenario)
+    spec['run'](probe, min(steps, 4))  # прогрев (компиляция Numba, загрузка моделей)
+    ids, values, mode_s = _timed(spec['run'], _model(scenario, **spec.get('kwargs', {})), steps)
+
+    rows = {agent: i for i, agent in enumerate(ref_ids)}
+    expected = ref_values[[rows[a] for a in ids]]
+    diff = np.abs(values - expected)
+    bad = ~(diff <= spec['atol'] + spec['rtol'] * np.abs(expected))
+    bad &= ~(np.isnan(values) & np.isnan(expected))
+    report.update(status='diverged' if bad.any() else 'ok',
+                  max_abs=float(np.nanmax(diff)) if diff.size else 0.0,
+                  ref_s=ref_s, mode_s=mode_s, agents=len(ids), steps=steps)
+    if bad.any():
+        step = int(np.argmax(bad.any(axis=0)))
+        row = int(np.argmax(bad[:, step]))
+        agent = int(ids[row])
+        report['first'] = {'step': step, 'datetime': stamps[step], 'agent': agent,
+                           'type': types[agent], 'expected': expected[row, step],
+                           'got': values[row, step]}
+    return report
+
+
+def run_all(scenarios=None, modes=None) -> list:
+    reports = []
+    for scenario in scenarios or SCENARIOS:
+        ref = reference(scenario)
+        for mode in modes or MODES:
+            report = check(scenario, mode, ref)
+            reports.append(report)
+            print(format_report(report), flush=True)
+    return reports
+
+
+def format_report(report) -> str:
+    head = f"{report['scenario']:14s} {report['mode']:20s}"
+    if report['status'] == 'skipped':
+        return f"{head} пропущен: {report['reason']}"
+    line = (f"{head} {report['status']:8s} max|Δ|={report['max_abs']:.3g}  "
+            f"эталон {report['ref_s']:.3f} с, режим {report['mode_s']:.3f} с "
+            f"(×{report['ref_s'] / max(report['mode_s'], 1e-9):.1f}; "
+            f"{report['agents']} зданий × {report['steps']} шагов)")
+    first = report.get('first')
+    if first:
+        line += (f"\n{'':14s} первое расхождение: шаг {first['step']} ({first['datetime']}), "
+                 f"здание {first['agent']} ({first['type']}): "
+                 f"эталон {float(first['expected'])!r}, режим {float(first['got'])!r}")
+    return line
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Сверка ускоренных режимов с эталоном")
+    parser.add_argument('--scenario', nargs='+', choices=list(SCENARIOS))
+    parser.add_argument('--mode', nargs='+', choices=list(MODES))
+    args = parser.parse_args()
+    reports = run_all(args.scenario, args.mode)
+    sys.exit(1 if any(r['status'] == 'diverged' for r in reports) else 0)
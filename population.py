@@ -0,0 +1,127 @@
+"""
+Загрузка парка зданий из таблицы — одна строка на здание.
+
+Колонки:
+    type      — тип здания из реестра (registry.py): office, mall, ...
+    area      — площадь, м² (для типов с параметром площади; пусто — по умолчанию)
+    district  — район / фидер здания (необязательно)
+    <параметр> — любые параметры схемы типа (escalator_count, opening_hour, ...);
+                 пусто — значение по умолчанию
+
+Таблица — CSV или колоночный .npz. Проверка выполняется над колонками
+целиком, здания создаются пачками по типам (в порядке реестра, внутри
+типа — в порядке строк).
+
+    model = EnergyConsumptionModel(population='data/buildings.csv')
+"""
+import os
+import numpy as np
+import pandas as pd
+
+import registry
+
+REQUIRED_COLUMNS = ['type']
+RESERVED_COLUMNS = ['type', 'area', 'district']
+
+
+def read_population(path: str) -> pd.DataFrame:
+    """Читает таблицу зданий из CSV или .npz."""
+    if os.path.splitext(path)[1] == '.npz':
+        with np.load(path) as data:
+            return pd.DataFrame({c: data[c] for c in data.files})
+    return pd.read_csv(path)
+
+
+def validate_population(df: pd.DataFrame) -> dict:
+    """
+    Проверяет таблицу и раскладывает её по типам:
+    {тип: {'params': {параметр: массив (N,)}, 'district': массив (N,)}}.
+    NaN в параметре означает значение по умолчанию, пустой район — None
+    (здание относится к району модели). Ошибки собираются по
+    всей таблице и выдаются одним ValueError с номерами строк.
+    """
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"В таблице зданий нет колонок {missing}")
+
+    errors = []
+    types = df['type'].astype(str).to_numpy()
+    unknown = ~np.isin(types, list(registry.REGISTRY))
+    if unknown.any():
+        errors.append(_rows("неизвестный тип", unknown, df, types))
+
+    param_columns = [c for c in df.columns if c not in RESERVED_COLUMNS]
+    numeric = {}
+    for col in param_columns + (['area'] if 'area' in df.columns else []):
+        values = pd.to_numeric(df[col], errors='coerce').to_numpy(float)
+        bad = df[col].notna().to_numpy() & ~np.isfinite(values)
+        bad |= values < 0
+        if bad.any():
+            errors.append(_rows(f"{col}: не неотрицательное число", bad, df, df[col].to_numpy()))
+        numeric[col] = values
+
+    populations = {}
+    for name, building_type in registry.REGISTRY.items():
+        mask = types == name
+        if not mask.any():
+            continue
+        params = {}
+        for col, values in numeric.items():
+            target = building_type.area_param if col == 'area' else col
+            given = ~np.isnan(values[mask])
+            if target not in building_type.params:
+                if given.any():
+                    errors.append(_rows(f"{name}: нет параметра {col}", mask & ~np.isnan(values), df, values))
+                continue
+            params[target] = values[mask]
+        for p, default in building_type.params.items():
+            if default is not None:
+                column = params.get(p, np.full(mask.sum(), np.nan))
+                params[p] = np.where(np.isnan(column), default, column)
+        for rule, check in building_type.checks.items():
+            ok = np.asarray(check(params))
+            if not ok.all():
+                bad = np.zeros(len(df), dtype=bool)
+                bad[np.flatnonzero(mask)[~ok]] = True
+                errors.append(_rows(f"{name}: нарушено {rule}", bad, df, types))
+        district = (df['district'].to_numpy(object)[mask] if 'district' in df.columns
+                    else np.full(mask.sum(), None, dtype=object))
+        # пустая ячейка (NaN из CSV, '' из .npz) — район модели
+        district[pd.isna(district) | (district == '')] = None
+        populations[name] = {'params': params, 'district': district}
+
+    if errors:
+        raise ValueError("Ошибки в таблице зданий:\n" + "\n".join(errors))
+    return populations
+
+
+def _rows(message, bad, df, values, limit=5):
+    idx = np.flatnonzero(bad)
+    shown = ", ".join(f"{i} ({values[i]})" for i in idx[:limit])
+    more = f" и ещё {len(idx) - limit}" if len(idx) > limit else ''
+    return f"  {message}: строки {shown}{more}"
+
+
+def create_agents(model, building_type, params: dict, district) -> list:
+    """
+    Создаёт здания одного типа по массивам параметров. Целочисленные
+    параметры схемы приводятся к int; NaN (для параметра без значения по
+    умолчанию) не передаётся в конструктор.
+    """
+    n = len(district)
+    columns = []
+    for p, values in params.items():
+        default = building_type.params.get(p)
+        if isinstance(default, (int, np.integer)):
+            values = values.astype(int)
+        columns.append((p, values.tolist(), np.isnan(values).tolist()
+                        if values.dtype.kind == 'f' else [False] * n))
+
+    agent_class = building_type.agent_class
+    agents = []
+    for i in range(n):
+        kwargs = {p: values[i] for p, values, missing in columns if not missing[i]}
+        agent = agent_class(model, **kwargs)
+        agent.district = district[i]
+        agents.append(agent)
+    return agents
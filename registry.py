@@ -0,0 +1,192 @@
+"""
+Реестр типов зданий.
+
+Тип здания регистрируется один раз: имя, класс агента, схема параметров
+(имя → значение по умолчанию) и векторная функция потребления над
+(здания × шаги). EnergyConsumptionModel создаёт здания по словарю
+{тип: количество} и для всех зарегистрированных типов считает
+потребление пачкой (EnergyConsumptionModel.batch_consumption).
+
+Новый тип не требует правок model.py, а класс агента необязателен:
+без него здания шагают через BatchBuildingAgent, который вызывает ту же
+векторную функцию на одном шаге.
+
+    register('warehouse', params={'area': 3000.0},
+             batch=lambda model, env, p, agents: p['area'][:, None] * np.where(env['hour'] < 8, 2.0, 5.0))
+    model = EnergyConsumptionModel(buildings={'warehouse': 10, 'office': 3})
+"""
+import numpy as np
+from mesa import Agent
+
+import kernels
+from EnterpriseBuilding.agent import EnterpriseBuildingAgent
+from OfficeBuilding.agent import OfficeBuildingAgent
+from HospitalBuilding.agent import HospitalBuildingAgent
+from MallBuilding.agent import MallAgent
+from ModernResidentialBuilding.agent import ModernResidentialBuildingAgent
+from ResidentialBuilding.agent import ResidentialBuildingAgent
+
+
+class BuildingType:
+    """
+    Описание типа здания.
+
+    params — схема параметров {имя: значение по умолчанию}; параметры
+    передаются в конструктор агента и читаются из агентов для пачечного
+    расчёта. batch(model, env, params, agents) → массив (N, T) энергии за
+    часовой шаг, где env — model.environment_arrays(T), params — {имя:
+    массив (N,)}, agents — N агентов этого типа.
+
+    area_param — параметр, в который попадает колонка area таблицы зданий
+    (population.py); checks — {описание: функция(params) → маска допустимых
+    строк} для векторной проверки параметров.
+    """
+
+    def __init__(self, name, agent_class=None, params=None, batch=None,
+                 area_param=None, checks=None):
+        self.name = name
+        self.params = dict(params or {})
+        self.batch = batch
+        self.area_param = area_param or ('area' if 'area' in self.params else None)
+        self.checks = dict(checks or {})
+        if agent_class is None:
+            cls_name = ''.join(part.title() for part in name.split('_')) + 'Agent'
+            agent_class = type(cls_name, (BatchBuildingAgent,), {'building_type': self})
+        self.agent_class = agent_class
+
+    def __repr__(self):
+        return f"BuildingType({self.name!r}, {self.agent_class.__name__}, params={list(self.params)})"
+
+
+REGISTRY: dict[str, BuildingType] = {}
+
+
+def register(name, agent_class=None, params=None, batch=None,
+             area_param=None, checks=None) -> BuildingType:
+    """Регистрирует тип здания (повторная регистрация заменяет описание)."""
+    building_type = BuildingType(name, agent_class, params, batch, area_param, checks)
+    REGISTRY[name] = building_type
+    return building_type
+
+
+def get(name) -> BuildingType:
+    try:
+        return REGISTRY[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный тип здания {name!r}; зарегистрированы: {list(REGISTRY)}") from None
+
+
+def normalize_config(buildings: dict) -> dict:
+    """
+    Приводит конфигурацию к виду {тип: (количество, параметры)} в порядке
+    регистрации типов. Значение — число зданий или словарь
+    {'count': n, <параметр схемы>: значение, ...}.
+    """
+    config = {}
+    for name, spec in buildings.items():
+        building_type = get(name)
+        if isinstance(spec, dict):
+            spec = dict(spec)
+            count = int(spec.pop('count', 1))
+            unknown = set(spec) - set(building_type.params)
+            if unknown:
+                raise ValueError(f"{name}: неизвестные параметры {sorted(unknown)}")
+        else:
+            count, spec = int(spec), {}
+        if count < 0:
+            raise ValueError(f"{name}: отрицательное число зданий {count}")
+        config[name] = (count, spec)
+    return {name: config[name] for name in REGISTRY if name in config}
+
+
+def agent_params(building_type: BuildingType, agents) -> dict:
+    """Параметры схемы, собранные из агентов в массивы (N,)."""
+    return {
+        p: np.array([getattr(a, p) for a in agents], dtype=float)
+        for p in building_type.params
+    }
+
+
+class BatchBuildingAgent(Agent):
+    """
+    Агент для типа без собственного класса: на каждом шаге вызывает
+    векторную функцию типа на одном шаге и умножает результат на
+    длительность шага. Функция должна зависеть только от входов текущего
+    шага (состояние между шагами не хранится).
+    """
+    building_type: BuildingType = None
+
+    def __init__(self, model, **params):
+        super().__init__(model)
+        for p, default in self.building_type.params.items():
+            setattr(self, p, params.get(p, default))
+        self.consumption = 0.0
+
+    def step(self):
+        bt = self.building_type
+        energy = bt.batch(self.model, self.model.step_environment(),
+                          agent_params(bt, [self]), [self])
+        self.consumption = float(np.asarray(energy).reshape(-1)[0]) * self.model.step_hours
+
+
+# ------------------------------ Встроенные типы ----------------------------------------
+
+def _per_building(usage, agents):
+    """Одинаковый ряд (T,) для всех зданий типа → (N, T)."""
+    return np.tile(usage, (len(agents), 1))
+
+
+def _enterprise_batch(model, env, params, agents):
+    usage = kernels.enterprise_usage(agents[0], env['datetime'], env['is_weekend'])
+    return _per_building(usage * 1000.0, agents)
+
+
+def _office_batch(model, env, params, agents):
+    ppl = env['office_population'] / model.num_office_agents
+    return kernels.office_energy(params['area'], env['hour'], env['month'], env['day'], ppl)
+
+
+def _hospital_batch(model, env, params, agents):
+    usage = kernels.hospital_energy(env['hospitalized'], env['patients'],
+                                    env['month'], env['day'])
+    return _per_building(usage, agents)
+
+
+def _mall_batch(model, env, params, agents):
+    occ = kernels.mall_occupancy(agents[0].occ_clf, env['T_out'], env['day_off'],
+                                 env['hour'], env['dow'], env['month'])
+    return kernels.mall_energy(
+        np.clip(occ, 0, 100) / 100, env['hour'], env['T_out'], env['month'], env['day'],
+        params['floor_area'], params['escalator_count'],
+        params['opening_hour'], params['closing_hour'],
+    )
+
+
+def _last_presence(agents):
+    """Присутствие прошлого шага каждого дома (NaN — дом ещё не шагал)."""
+    return np.array([np.nan if a._last_p is None else a._last_p for a in agents], dtype=float)
+
+
+def _modern_residential_batch(model, env, params, agents):
+    return kernels.residential_energy(_per_building(env['presence'], agents), env['month'],
+                                      env['day'], modern=True, last_p=_last_presence(agents))
+
+
+def _residential_batch(model, env, params, agents):
+    return kernels.residential_energy(_per_building(env['presence'], agents), env['month'],
+                                      env['day'], last_p=_last_presence(agents))
+
+
+# Порядок регистрации — порядок создания зданий (и их unique_id)
+register('enterprise', EnterpriseBuildingAgent, params={'lookup_tolerance': None},
+         batch=_enterprise_batch)
+register('office', OfficeBuildingAgent, params={'area': None}, batch=_office_batch)
+register('hospital', HospitalBuildingAgent, batch=_hospital_batch)
+register('mall', MallAgent,
+         params={'floor_area': 12700.0, 'escalator_count': 8,
+                 'opening_hour': 10, 'closing_hour': 22},
+         batch=_mall_batch, area_param='floor_area',
+         checks={'opening_hour < closing_hour <= 24':
+                 lambda p: (p['opening_hour'] < p['closing_hour']) & (p['closing_hour'] <= 24)})
+register('modern_residential', ModernResidentialBuildingAgent, batch=_modern_residential_batch)
+register('residential', ResidentialBuildingAgent, batch=_residential_batch)
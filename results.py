@@ -0,0 +1,263 @@
+"""
+Индексированное хранилище результатов симуляции.
+
+Вместо одного большого agent_data.csv результаты пишутся по временным
+партициям (по умолчанию — месяц). Партиция — каталог с колонками в .npy
+(datetime, AgentID, consumption), строки отсортированы по (AgentID, datetime).
+Небольшой index.json хранит тип каждого агента и для каждой партиции —
+диапазон строк каждого агента. Запрос открывает колонки через memory map
+и читает только нужные партиции и диапазоны строк.
+
+    results.write_results(agent_df, model_df)
+    df = results.load(types=['MallAgent'], start='2021-06-01', end='2021-07-01')
+"""
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+RESULTS_DIR = os.path.join('output', 'results')
+INDEX_FILE  = 'index.json'
+MODEL_FILE  = 'model_vars.npz'
+
+
+def write_results(agent_df: pd.DataFrame, model_df: pd.DataFrame | None = None,
+                  root: str = RESULTS_DIR, partition: str = 'M',
+                  freq: str | None = None) -> dict:
+    """
+    Записывает agent_df [datetime, AgentID, AgentType, consumption] в партиции
+    по времени (partition — период pandas: 'M' месяц, 'W' неделя, 'Y' год)
+    и строит индекс; model_df (переменные модели) — отдельным файлом.
+    freq — шаг модели, сохраняется в индексе (номер шага в партиции —
+    (datetime - start партиции) // freq).
+
+    Хранилище пишется во временный каталог рядом с root и затем встаёт на
+    место root. Существующий root заменяется, только если это хранилище
+    (в нём есть index.json), иначе — ValueError.
+    """
+    if os.path.exists(root) and not os.path.isfile(os.path.join(root, INDEX_FILE)):
+        raise ValueError(f"{root} существует и не является хранилищем результатов "
+                         f"(нет {INDEX_FILE}) — не перезаписываю")
+    parent = os.path.dirname(os.path.abspath(root))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix='.results-', dir=parent)
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(tmp, 0o777 & ~umask)  # mkdtemp создаёт каталог только для владельца
+    try:
+        index = _write_store(agent_df, model_df, tmp, partition, freq)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    if os.path.isdir(root):
+        old = tempfile.mkdtemp(prefix='.results-old-', dir=parent)
+        os.replace(root, os.path.join(old, 'store'))
+        os.replace(tmp, root)
+        shutil.rmtree(old)
+    else:
+        os.replace(tmp, root)
+    return index
+
+
+def _write_store(agent_df, model_df, root: str, partition: str, freq) -> dict:
+    """Партиции, переменные модели и индекс в пустой каталог root."""
+
+    df = agent_df[['datetime', 'AgentID', 'AgentType', 'consumption']].copy()
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    agents = df.drop_duplicates('AgentID').set_index('AgentID')['AgentType']
+    index = {
+        'partition': partition,
+        'freq': freq,
+        'agents': {str(a): t for a, t in agents.items()},
+        'partitions': [],
+    }
+
+    period_start = df['datetime'].dt.to_period(partition).dt.start_time
+    for start, part in df.groupby(period_start, sort=True):
+        part = part.sort_values(['AgentID', 'datetime'], kind='stable')
+        name = f'part-{start:%Y%m%d}'
+        os.makedirs(os.path.join(root, name))
+        ids = part['AgentID'].to_numpy(np.int64)
+        np.save(os.path.join(root, name, 'datetime.npy'), part['datetime'].to_numpy('datetime64[ns]'))
+        np.save(os.path.join(root, name, 'AgentID.npy'), ids)
+        np.save(os.path.join(root, name, 'consumption.npy'), part['consumption'].to_numpy(float))
+
+        # диапазоны строк каждого агента: [первая, последняя + 1)
+        bounds = np.flatnonzero(np.diff(ids)) + 1
+        starts = np.concatenate([[0], bounds])
+        ends = np.concatenate([bounds, [len(ids)]])
+        index['partitions'].append({
+            'name': name,
+            'start': part['datetime'].min().isoformat(),
+            'end': part['datetime'].max().isoformat(),
+            'rows': len(part),
+            'agent_rows': {str(ids[s]): [int(s), int(e)] for s, e in zip(starts, ends)},
+        })
+
+    if model_df is not None:
+        np.savez(os.path.join(root, MODEL_FILE),
+                 **{c: model_df[c].to_numpy() for c in model_df.columns
+                    if c != 'datetime' and model_df[c].dtype != object},
+                 datetime=pd.to_datetime(model_df['datetime']).to_numpy('datetime64[ns]'))
+
+    with open(os.path.join(root, INDEX_FILE), 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    return index
+
+
+def read_index(root: str = RESULTS_DIR) -> dict:
+    with open(os.path.join(root, INDEX_FILE), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def step_delta(index: dict):
+    """Шаг модели из индекса как np.timedelta64[ns]; None, если freq не сохранён."""
+    freq = index.get('freq')
+    return None if not freq else pd.Timedelta(pd.tseries.frequencies.to_offset(freq)).to_timedelta64()
+
+
+def agent_types(root: str = RESULTS_DIR) -> dict:
+    """AgentID → AgentType по индексу, без чтения данных."""
+    return {int(a): t for a, t in read_index(root)['agents'].items()}
+
+
+def load(agent_ids=None, types=None, start=None, end=None,
+         root: str = RESULTS_DIR) -> pd.DataFrame:
+    """
+    Строки [datetime, AgentID, AgentType, consumption] для выбранных агентов
+    (agent_ids и/или types) в интервале [start, end). Читаются только
+    партиции, пересекающие интервал, и только диапазоны строк этих агентов.
+    """
+    index = read_index(root)
+    types_by_agent = index['agents']
+    selected = set(types_by_agent) if agent_ids is None else {str(a) for a in agent_ids}
+    if types is not None:
+        types = set(types)
+        selected = {a for a in selected if types_by_agent.get(a) in types}
+
+    lo = None if start is None else np.datetime64(pd.Timestamp(start), 'ns')
+    hi = None if end is None else np.datetime64(pd.Timestamp(end), 'ns')
+
+    chunks = []
+    for part in index['partitions']:
+        if (hi is not None and np.datetime64(pd.Timestamp(part['start']), 'ns') >= hi) or \
+           (lo is not None and np.datetime64(pd.Timestamp(part['end']), 'ns') < lo):
+            continue
+        path = os.path.join(root, part['name'])
+        dt = np.load(os.path.join(path, 'datetime.npy'), mmap_mode='r')
+        ids = np.load(os.path.join(path, 'AgentID.npy'), mmap_mode='r')
+        cons = np.load(os.path.join(path, 'consumption.npy'), mmap_mode='r')
+        for agent, (s, e) in part['agent_rows'].items():
+            if agent not in selected:
+                continue
+            # внутри диапазона агента время отсортировано — сужаем бинарным поиском
+            if lo is not None:
+                s += int(np.searchsorted(dt[s:e], lo, side='left'))
+            if hi is not None:
+                e = s + int(np.searchsorted(dt[s:e], hi, side='left'))
+            if s < e:
+                chunks.append((np.array(dt[s:e]), np.array(ids[s:e]), np.array(cons[s:e])))
+
+    if not chunks:
+        return pd.DataFrame({'datetime': pd.Series(dtype='datetime64[ns]'),
+                             'AgentID': pd.Series(dtype=int), 'AgentType': pd.Series(dtype=object),
+                             'consumption': pd.Series(dtype=float)})
+    dt, ids, cons = (np.concatenate(c) for c in zip(*chunks))
+    df = pd.DataFrame({'datetime': dt, 'AgentID': ids, 'consumption': cons})
+    df.insert(2, 'AgentType', df['AgentID'].astype(str).map(types_by_agent))
+    return df.sort_values(['datetime', 'AgentID'], kind='stable', ignore_index=True)
+
+
+def load_model_vars(root: str = RESULTS_DIR) -> pd.DataFrame:
+    """Переменные модели (office_population, hospitalized, ...) с индексом datetime."""
+    with np.load(os.path.join(root, MODEL_FILE)) as data:
+        df = pd.DataFrame({c: data[c] for c in data.files})
+    return df.set_index('datetime')
+
+
+class CompactResults:
+    """
+    Компактное хранение consumption по агентам в памяти.
+
+    Значения — матрица шаги × агенты в float32 или int32 (энергия,
+    умноженная на scale и округлённая: scale=1 — целые Вт·ч) либо без
+    потерь в float64; место под capacity шагов выделяется заранее, время —
+    start + номер шага × freq, тип агента — код uint8 в types.
+    В pandas данные переводятся только по запросу (to_frame, by_type).
+    """
+
+    def __init__(self, agent_ids, agent_types, start, freq, first_step: int = 1,
+                 dtype: str = 'float32', scale: float = 1.0, capacity: int = 1024):
+        if dtype not in ('float32', 'int32', 'float64'):
+            raise ValueError(f"dtype должен быть 'float32', 'int32' или 'float64', получено {dtype!r}")
+        self.types = tuple(dict.fromkeys(agent_types))
+        if len(self.types) > 255:
+            raise ValueError("Больше 255 типов агентов не помещается в uint8")
+        self.agent_ids = np.asarray(agent_ids, dtype=np.int32)
+        codes = {t: i for i, t in enumerate(self.types)}
+        self.type_codes = np.array([codes[t] for t in agent_types], dtype=np.uint8)
+        self.start = pd.Timestamp(start)
+        self.freq = pd.Timedelta(freq)
+        self.first_step = first_step
+        self.dtype = np.dtype(dtype)
+        self.scale = scale
+        self._values = np.empty((capacity, len(self.agent_ids)), dtype=self.dtype)
+        self.n_steps = 0
+
+    def append(self, consumption: np.ndarray):
+        """Добавляет значения одного шага (в порядке agent_ids)."""
+        if self.n_steps == len(self._values):
+            grown = np.empty((2 * len(self._values), self._values.shape[1]), dtype=self.dtype)
+            grown[:self.n_steps] = self._values
+            self._values = grown
+        if self.dtype.kind == 'i':
+            scaled = np.rint(np.asarray(consumption, dtype=float) * self.scale)
+            if np.abs(scaled).max(initial=0) > np.iinfo(np.int32).max:
+                raise OverflowError("Значение не помещается в int32, уменьшите scale")
+            self._values[self.n_steps] = scaled
+        else:
+            self._values[self.n_steps] = consumption
+        self.n_steps += 1
+
+    @property
+    def values(self) -> np.ndarray:
+        """Матрица шаги × агенты в хранимом типе (без копии)."""
+        return self._values[:self.n_steps]
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.agent_ids.nbytes + self.type_codes.nbytes
+
+    def consumption(self) -> np.ndarray:
+        """Матрица шаги × агенты в float64 (в исходных единицах)."""
+        values = self.values.astype(np.float64)
+        return values / self.scale if self.dtype.kind == 'i' else values
+
+    def datetimes(self) -> pd.DatetimeIndex:
+        return pd.date_range(self.start, periods=self.n_steps, freq=self.freq, name='datetime')
+
+    def by_type(self) -> pd.DataFrame:
+        """Суммарная энергия по типам: datetime × AgentType."""
+        values = self.consumption()
+        return pd.DataFrame(
+            {t: values[:, self.type_codes == i].sum(axis=1) for i, t in enumerate(self.types)},
+            index=self.datetimes()
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Длинная таблица [Step, datetime, AgentID, AgentType, consumption]; main.py
+        пишет её в agent_data.csv без datetime (метки — в run_meta.json).
+        """
+        n_agents = len(self.agent_ids)
+        steps = np.arange(self.first_step, self.first_step + self.n_steps)
+        return pd.DataFrame({
+            'Step': np.repeat(steps, n_agents),
+            'datetime': np.repeat(self.datetimes().to_numpy(), n_agents),
+            'AgentID': np.tile(self.agent_ids, self.n_steps),
+            'AgentType': pd.Categorical.from_codes(np.tile(self.type_codes, self.n_steps),
+                                                   categories=list(self.types)),
+            'consumption': self.consumption().ravel(),
+        })
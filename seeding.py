@@ -0,0 +1,46 @@
+"""
+Потоки случайных чисел зданий.
+
+У модели один корневой seed. Поток здания выводится из него по ключу
+(тип здания, номер здания этого типа в порядке создания): это узел
+дерева SeedSequence(seed).spawn(...) — сначала по типу, затем по номеру,
+— построенный сразу по spawn_key, без порождения соседних узлов.
+
+Поток не зависит от unique_id и от того, какие ещё здания есть в модели,
+поэтому прогон, разбитый по типам (distributed.split_by_type), и здания,
+созданные в другом порядке типов, получают те же значения, что и в общем
+последовательном прогоне.
+
+Независимые модели одного прогона получают свои корневые seed, иначе
+здание k каждой модели получило бы одни и те же случайные параметры:
+районы — named_seed по имени района (не зависит от порядка и состава
+списка районов), реплики ансамбля — spawn_seeds по номеру реплики.
+"""
+import zlib
+import numpy as np
+
+DEFAULT_SEED = 200
+
+
+def type_key(kind: str) -> int:
+    """Номер типа здания в дереве потоков (не зависит от PYTHONHASHSEED)."""
+    return zlib.crc32(kind.encode('utf-8'))
+
+
+def agent_seed_sequence(seed: int, kind: str, index: int) -> np.random.SeedSequence:
+    return np.random.SeedSequence(seed, spawn_key=(type_key(kind), index))
+
+
+def agent_rng(seed: int, kind: str, index: int) -> np.random.Generator:
+    """Генератор здания index типа kind для корневого seed."""
+    return np.random.default_rng(agent_seed_sequence(seed, kind, index))
+
+
+def spawn_seeds(seed: int, n: int) -> list[int]:
+    """Корневые seed n независимых моделей: SeedSequence(seed).spawn(n), по номеру модели."""
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(n)]
+
+
+def named_seed(seed: int, name: str) -> int:
+    """Корневой seed модели name (района): узел SeedSequence(seed) по ключу crc32(name)."""
+    return int(np.random.SeedSequence(seed, spawn_key=(type_key(name),)).generate_state(1)[0])
@@ -0,0 +1,231 @@
+"""
+Асинхронный сервис симуляции EnergyConsumptionModel.
+
+Долгоживущий процесс: симуляции выполняются в пуле процессов (они
+нагружают CPU, и потоки упирались бы в GIL; глобальные настройки вроде
+kernels.BACKEND у каждого процесса свои). Каждый процесс пула при старте
+загружает регрессоры, план предприятия и данные окружения, и они остаются
+в памяти (кэши load_clf, load_regressor, load_plan, load_environment),
+поэтому запрос what-if не платит за чтение pickle/CSV. Агрегаты приходят
+из процесса через очередь и отдаются клиенту по мере расчёта — chunked
+HTTP, по строке JSON (NDJSON) на шаг или на сутки. Ошибка после начала
+ответа приходит последней строкой {"error": ...}.
+
+    python service.py --port 8765
+
+    POST /simulate
+    {"model": {"n_offices": 3}, "start_datetime": "2021-01-01 00:00",
+     "steps": 168, "freq": "1h", "every": "step" | "day"}
+
+    GET /health
+"""
+import json
+import queue
+import asyncio
+import argparse
+import multiprocessing
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from aggregators import Aggregator
+from model import EnergyConsumptionModel
+
+HOST, PORT = '127.0.0.1', 8765
+
+
+class StreamingAggregator(Aggregator):
+    """
+    Передаёт агрегаты в emit по мере расчёта: на каждом шаге (every='step')
+    или по завершении суток (every='day'; остаток — в flush).
+    """
+    name = 'stream'
+
+    def __init__(self, emit, every: str = 'step'):
+        self.emit = emit
+        self.every = every
+        self._day = None
+        self._by_type = {}
+
+    def update(self, stamp, loads, step_hours):
+        by_type = {}
+        for (agent_type, _), value in loads.items():
+            by_type[agent_type] = by_type.get(agent_type, 0.0) + value
+
+        if self.every == 'step':
+            self._send(pd.Timestamp(stamp), by_type)
+            return
+        day = pd.Timestamp(stamp).normalize()
+        if self._day is not None and day != self._day:
+            self.flush()
+        self._day = day
+        for agent_type, value in by_type.items():
+            self._by_type[agent_type] = self._by_type.get(agent_type, 0.0) + value
+
+    def flush(self):
+        if self._day is not None and self._by_type:
+            self._send(self._day, self._by_type)
+        self._by_type = {}
+
+    def _send(self, stamp, by_type):
+        self.emit({'datetime': stamp.isoformat(), 'total': sum(by_type.values()),
+                   'by_type': by_type})
+
+    def result(self):
+        return None
+
+
+def simulate(request: dict, emit) -> None:
+    """Синхронный прогон одного запроса; агрегаты уходят в emit."""
+    stream = StreamingAggregator(emit, request.get('every', 'step'))
+    model = EnergyConsumptionModel(
+        **request.get('model', {}),
+        start_datetime=pd.Timestamp(request.get('start_datetime', '2021-01-01 00:00')),
+        freq=request.get('freq', '1h'),
+        skip_idle=request.get('skip_idle', True),
+        aggregators=[stream],
+        collect_agents=False,
+    )
+    for _ in range(int(request['steps'])):
+        model.step()
+    stream.flush()
+
+
+def _warm_up():
+    """Прогревает кэши моделей и данных процесса одной короткой симуляцией."""
+    simulate({'steps': 1}, lambda row: None)
+
+
+def _run(request: dict, rows) -> None:
+    """Прогон в процессе пула: строки и ошибка — в очередь rows, в конце None."""
+    try:
+        simulate(request, rows.put)
+    except Exception as exc:
+        rows.put({'error': repr(exc)})
+    finally:
+        rows.put(None)
+
+
+class SimulationService:
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_warm_up)
+        self.manager = multiprocessing.Manager()
+
+    def warm_up(self):
+        """Запускает процессы пула (каждый прогревает кэши при старте)."""
+        for future in [self.pool.submit(int) for _ in range(self.max_workers)]:
+            future.result()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        started = False
+        try:
+            method, path, headers, body = await _read_request(reader)
+            if method == 'GET' and path == '/health':
+                await _send_json(writer, 200, {'status': 'ok'})
+            elif method == 'POST' and path == '/simulate':
+                request = json.loads(body or b'{}')
+                started = True
+                await self._stream(writer, request)
+            else:
+                await _send_json(writer, 404, {'error': f'{method} {path}'})
+        except Exception as exc:
+            # после заголовков 200 отдельный ответ 400 сломал бы поток —
+            # ошибки _stream уже переданы строкой NDJSON
+            if not started:
+                await _send_json(writer, 400, {'error': repr(exc)})
+        finally:
+            writer.close()
+
+    async def _stream(self, writer, request):
+        loop = asyncio.get_running_loop()
+        rows = self.manager.Queue()
+
+        writer.write(b'HTTP/1.1 200 OK\r\n'
+                     b'Content-Type: application/x-ndjson\r\n'
+                     b'Transfer-Encoding: chunked\r\n\r\n')
+        future = loop.run_in_executor(self.pool, _run, request, rows)
+        try:
+            while True:
+                try:
+                    row = await loop.run_in_executor(None, rows.get, True, 1.0)
+                except queue.Empty:
+                    if future.done():
+                        future.result()  # процесс пула упал, не дописав очередь
+                        break
+                    continue
+                if row is None:
+                    break
+                await _send_chunk(writer, row)
+            await future
+        except Exception as exc:
+            await _send_chunk(writer, {'error': repr(exc)})
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+
+async def _send_chunk(writer, row):
+    data = (json.dumps(row) + '\n').encode()
+    writer.write(b'%X\r\n%s\r\n' % (len(data), data))
+    await writer.drain()
+
+
+async def _read_request(reader):
+    request_line = (await reader.readline()).decode().strip()
+    method, path, _ = request_line.split(' ', 2)
+    headers = {}
+    while (line := (await reader.readline()).decode().strip()):
+        key, _, value = line.partition(':')
+        headers[key.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    return method, path, headers, body
+
+
+async def _send_json(writer, status, payload):
+    data = json.dumps(payload).encode()
+    reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found'}[status]
+    writer.write(f'HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n'
+                 f'Content-Length: {len(data)}\r\n\r\n'.encode() + data)
+    await writer.drain()
+
+
+async def stream_simulation(request: dict, host: str = HOST, port: int = PORT):
+    """Клиент: отправляет запрос и асинхронно отдаёт строки результата по мере прихода."""
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(request).encode()
+    writer.write(f'POST /simulate HTTP/1.1\r\nHost: {host}\r\n'
+                 f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'.encode()
+                 + body)
+    await writer.drain()
+    status = (await reader.readline()).decode()
+    while (await reader.readline()).strip():
+        pass
+    if ' 200 ' not in status:
+        raise RuntimeError(status.strip())
+    try:
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            if size == 0:
+                break
+            chunk = await reader.readexactly(size + 2)
+            yield json.loads(chunk[:-2])
+    finally:
+        writer.close()
+
+
+async def serve(host: str = HOST, port: int = PORT, max_workers: int = 4):
+    service = SimulationService(max_workers)
+    service.warm_up()
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Serving on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Сервис симуляции энергопотребления")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.workers))
@@ -0,0 +1,239 @@
+"""
+Сценарии «что если» для управления спросом.
+
+Базовый прогон (потребление каждого здания на каждом шаге) считается один
+раз и кэшируется на диске по хэшу сценария (параметры модели + число
+шагов, а также содержимое файлов входов: погоды, плана предприятия и
+обученных моделей). Сценарий меняет параметры части зданий — возможно, только на
+шагах, где выполнено условие when, — и пересчитывает только эти здания:
+окружение модели идёт по всем шагам, а шагают лишь затронутые здания.
+Здания без состояния между шагами (не объявившие STEADY_STATE) шагают
+только там, где изменение действует; на остальных шагах их потребление
+равно базовому.
+
+    engine = WhatIf(steps=24 * 28, start_datetime=datetime(2021, 6, 1), n_offices=3)
+    # ТРЦ открываются и закрываются на час позже
+    shift = engine.run('mall', {'opening_hour': lambda a: a.opening_hour + 1,
+                                'closing_hour': lambda a: a.closing_hour + 1})
+    # насосы отопления офисов выключены в нерабочие дни
+    pumps = engine.run('office', {'heating_pump_density': 0.0},
+                       when=lambda model: model.current_day_off)
+    shift['delta'].plot()
+"""
+import hashlib
+import inspect
+import json
+import os
+import numpy as np
+import pandas as pd
+
+import registry
+from model import EnergyConsumptionModel
+
+CACHE_DIR = os.path.join('output', 'whatif')
+# Меняется при изменении формата кэша или расчёта базового прогона
+CACHE_VERSION = 3
+
+_BASE = os.path.dirname(os.path.abspath(__file__))
+# Файлы, которые читают здания: план предприятия и обученные модели
+INPUT_FILES = [
+    os.path.join(_BASE, 'EnterpriseBuilding', 'data', 'production_plan.csv'),
+    os.path.join(_BASE, 'EnterpriseBuilding', 'trained_models', 'best_enterprise_model.pkl'),
+    os.path.join(_BASE, 'MallBuilding', 'trained_models', 'best_mall_model.pkl'),
+]
+
+
+def _jsonable(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return 'frame:' + format(int(pd.util.hash_pandas_object(value).sum()) & (2**64 - 1), 'x')
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Параметр сценария типа {type(value).__name__} нельзя включить в ключ кэша")
+
+
+def _file_digest(path: str):
+    """sha256 файла (None, если файла нет)."""
+    if not os.path.isfile(path):
+        return None
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _input_files(model_kwargs: dict) -> list:
+    default = inspect.signature(EnergyConsumptionModel).parameters['weather_path'].default
+    files = [model_kwargs.get('weather_path', default)] + INPUT_FILES
+    if isinstance(model_kwargs.get('population'), str):
+        files.append(model_kwargs['population'])
+    return files
+
+
+def scenario_hash(steps: int, **model_kwargs) -> str:
+    """
+    Хэш базового сценария: параметры EnergyConsumptionModel, число шагов и
+    sha256 файлов входов (погода, таблица зданий, план, обученные модели).
+    Параметр, который нельзя однозначно сериализовать, — TypeError.
+    """
+    spec = {'version': CACHE_VERSION, 'steps': steps, 'model': model_kwargs,
+            'files': {os.path.abspath(p): _file_digest(p) for p in _input_files(model_kwargs)}}
+    text = json.dumps(spec, sort_keys=True, default=_jsonable)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def _select(model, agents) -> list:
+    """Здания сценария: тип реестра, список unique_id или функция agent → bool."""
+    if isinstance(agents, str):
+        agent_class = registry.get(agents).agent_class
+        return list(model.agents_by_type.get(agent_class, []))
+    if callable(agents):
+        return [a for a in model.agents if agents(a)]
+    ids = set(agents)
+    return [a for a in model.agents if a.unique_id in ids]
+
+
+class WhatIf:
+    """
+    Базовый прогон модели и сценарии относительно него.
+
+    steps — число шагов, model_kwargs — параметры EnergyConsumptionModel
+    (те же для базового прогона и для сценариев: здания, их unique_id и
+    площади совпадают). collect_agents не используется: сбор по агентам
+    в прогонах сценариев всегда выключен.
+    """
+
+    def __init__(self, steps: int, cache_dir: str = CACHE_DIR, **model_kwargs):
+        self.steps = steps
+        model_kwargs.pop('collect_agents', None)
+        self.model_kwargs = model_kwargs
+        self.cache_dir = cache_dir
+        self.key = scenario_hash(steps, **model_kwargs)
+        self._baseline = None
+
+    def _model(self):
+        return EnergyConsumptionModel(collect_agents=False, **self.model_kwargs)
+
+    def baseline(self) -> dict:
+        """
+        Базовый прогон: {'datetime': (T,), 'agent_ids': (N,),
+        'consumption': (N, T) в Вт·ч}. Берётся из кэша, если он есть.
+        """
+        if self._baseline is not None:
+            return self._baseline
+        path = os.path.join(self.cache_dir, f'{self.key}.npz')
+        if os.path.isfile(path):
+            with np.load(path) as data:
+                self._baseline = {k: data[k] for k in data.files}
+            return self._baseline
+
+        model = self._model()
+        agents = list(model.agents)
+        consumption = np.empty((len(agents), self.steps))
+        datetimes = model.step_datetime(np.arange(self.steps))
+        for t in range(self.steps):
+            model.prepare_step()
+            for agent in agents:
+                agent.step()
+            consumption[:, t] = [a.consumption for a in agents]
+            model.finish_step()
+
+        self._baseline = {
+            'datetime': datetimes,
+            'agent_ids': np.array([a.unique_id for a in agents]),
+            'consumption': consumption,
+        }
+        os.makedirs(self.cache_dir, exist_ok=True)
+        np.savez(path, **self._baseline)
+        return self._baseline
+
+    def run(self, agents, params: dict, when=None) -> pd.DataFrame:
+        """
+        Сценарий: здания agents (тип реестра, список unique_id или функция
+        agent → bool) получают параметры params ({атрибут: значение или
+        функция agent → значение}); при when(model) → bool — только на
+        шагах, где условие выполнено.
+
+        Возвращает DataFrame по datetime: baseline и scenario — суммарная
+        нагрузка всех зданий, delta — разница (Вт·ч за шаг).
+        """
+        base = self.baseline()
+        model = self._model()
+        targets = _select(model, agents)
+        if not targets:
+            raise ValueError(f"Сценарий не затрагивает ни одного здания: {agents!r}")
+        for agent in targets:
+            missing = [p for p in params if not hasattr(agent, p)]
+            if missing:
+                raise ValueError(f"У здания {agent.unique_id} ({type(agent).__name__}) "
+                                 f"нет параметров {missing}")
+
+        original = [{p: getattr(a, p) for p in params} for a in targets]
+        changed = [{p: v(a) if callable(v) else v for p, v in params.items()} for a in targets]
+        stateful = [bool(getattr(a, 'STEADY_STATE', ())) for a in targets]
+
+        row_of = {agent_id: i for i, agent_id in enumerate(base['agent_ids'].tolist())}
+        rows = np.array([row_of[a.unique_id] for a in targets])
+        scenario = base['consumption'][rows].copy()
+        for t in range(self.steps):
+            model.prepare_step()
+            active = True if when is None else bool(when(model))
+            for k, agent in enumerate(targets):
+                if not (active or stateful[k]):
+                    continue
+                for p, v in (changed[k] if active else original[k]).items():
+                    setattr(agent, p, v)
+                agent.step()
+                scenario[k, t] = agent.consumption
+            model.finish_step()
+
+        delta = (scenario - base['consumption'][rows]).sum(axis=0)
+        total = base['consumption'].sum(axis=0)
+        return pd.DataFrame({'baseline': total, 'scenario': total + delta, 'delta': delta},
+                            index=pd.DatetimeIndex(base['datetime'], name='datetime'))
+
+
+if __name__ == '__main__':
+    import time
+    from datetime import datetime
+
+    kwargs = dict(start_datetime=datetime(2021, 3, 1), n_offices=3)
+    engine = WhatIf(steps=24 * 14, cache_dir=os.path.join(CACHE_DIR, 'check'), **kwargs)
+    t0 = time.perf_counter()
+    engine.baseline()
+    t1 = time.perf_counter()
+    shift = engine.run('mall', {'opening_hour': lambda a: a.opening_hour + 1,
+                                'closing_hour': lambda a: a.closing_hour + 1})
+    t2 = time.perf_counter()
+    pumps = engine.run('office', {'heating_pump_density': 0.0},
+                       when=lambda model: model.current_day_off)
+    t3 = time.perf_counter()
+    print(f"базовый прогон {t1 - t0:.2f} с, ТРЦ +1 ч {t2 - t1:.2f} с, насосы {t3 - t2:.2f} с")
+
+    # Проверка: сценарий совпадает с полным прогоном с изменёнными параметрами
+    for frame, select, params, when in [
+        (shift, 'mall', {'opening_hour': 11, 'closing_hour': 23}, None),
+        (pumps, 'office', {'heating_pump_density': 0.0}, lambda m: m.current_day_off),
+    ]:
+        model = EnergyConsumptionModel(**{**kwargs, 'collect_agents': False})
+        agents = list(model.agents)
+        targets = _select(model, select)
+        original = {id(a): {p: getattr(a, p) for p in params} for a in targets}
+        total = np.empty(engine.steps)
+        for t in range(engine.steps):
+            model.prepare_step()
+            active = when is None or when(model)
+            for a in targets:
+                for p, v in (params if active else original[id(a)]).items():
+                    setattr(a, p, v)
+            for a in agents:
+                a.step()
+            total[t] = sum(a.consumption for a in agents)
+            model.finish_step()
+        diff = np.abs(frame['scenario'].to_numpy() - total).max()
+        print(f"{select}: Δ за период {frame['delta'].sum() / 1e3:.1f} кВт·ч, "
+              f"расхождение с полным прогоном {diff:.2e}")